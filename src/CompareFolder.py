@@ -1,73 +1,834 @@
-import os
-import difflib
-import argparse
-
-SKIP_EXTS = {'.png','.jpg','.jpeg','.gif','.mp3','.wav','.ogg','.mp4','.avi','.webm','.flac','.bmp','.tga','.ico'}
-
-def should_skip(file_path: str) -> bool:
-    _, ext = os.path.splitext(file_path.lower())
-    return ext in SKIP_EXTS
-
-def find_by_name(root, filename):
-    matches = []
-    for dirpath, _, files in os.walk(root):
-        if filename in files:
-            matches.append(os.path.join(dirpath, filename))
-    return matches
-
-def compare_files(original_file, modified_file):
-    with open(modified_file, 'r', errors='ignore') as f:
-        mod_lines = f.readlines()
-    if os.path.exists(original_file):
-        with open(original_file, 'r', errors='ignore') as f:
-            orig_lines = f.readlines()
-        diff_lines = difflib.unified_diff(orig_lines, mod_lines, fromfile=original_file, tofile=modified_file, lineterm='')
-
-        converted = []
-        for line in diff_lines:
-            if line.startswith('-') and not line.startswith('---'):
-                converted.append('−' + line[1:])
-            elif line.startswith('+') and not line.startswith('+++'):
-                converted.append('+' + line[1:])
-            else:
-                converted.append(line)
-        return '\n'.join(converted)
-    else:
-        return '\n'.join('+ ' + line.rstrip('\n') for line in mod_lines)
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('input_folder', help='Original folder')
-    parser.add_argument('-mo', '--modified_folder', required=True, help='Modified folder')
-    parser.add_argument('-o', '--output_folder', required=True, help='Output folder')
-    args = parser.parse_args()
-
-    original_root = os.path.abspath(args.input_folder)
-    modified_root = os.path.abspath(args.modified_folder)
-    output_root = os.path.abspath(args.output_folder)
-
-    for dirpath, _, filenames in os.walk(modified_root):
-        for fname in filenames:
-            mod_file = os.path.join(dirpath, fname)
-            if should_skip(mod_file):
-                continue
-
-            rel_path = os.path.relpath(mod_file, modified_root)
-            orig_file = os.path.join(original_root, rel_path)
-
-            if not os.path.exists(orig_file):
-                matches = find_by_name(original_root, fname)
-                if len(matches) == 1:
-                    orig_file = matches[0]
-
-            diff_text = compare_files(orig_file, mod_file)
-            if not diff_text.strip():
-                continue
-
-            out_path = os.path.join(output_root, rel_path) + '.cfc'
-            os.makedirs(os.path.dirname(out_path), exist_ok=True)
-            with open(out_path, 'w', encoding='utf-8') as out:
-                out.write(diff_text)
-
-if __name__ == '__main__':
-    main()
+import os
+import json
+import zlib
+import bisect
+import random
+import difflib
+import hashlib
+import argparse
+from multiprocessing import Pool
+
+COMPARE_CHUNK_SIZE = 1024 * 1024
+SNAPSHOT_VERSION = 3
+DIFF_ENGINES = ('difflib', 'patience')
+# Regions without anchors larger than this are not handed to difflib, they become one replace
+PATIENCE_FALLBACK_LINES = 2000
+# Lines read from each file per window by the streaming diff
+STREAM_WINDOW_LINES = 20000
+# Rename detection: MinHash signatures of the set of lines, split into LSH bands
+# (8 bands of 4 rows find pairs above ~60% similarity with high probability)
+RENAME_PERMUTATIONS = 32
+RENAME_BANDS = 8
+RENAME_SIMILARITY = 0.5
+MINHASH_PRIME = (1 << 61) - 1
+# A fixed seed so every worker process uses the same hash functions
+_minhash_rng = random.Random(20)
+MINHASH_PARAMS = [(_minhash_rng.randrange(1, MINHASH_PRIME), _minhash_rng.randrange(MINHASH_PRIME))
+                  for _ in range(RENAME_PERMUTATIONS)]
+# Files with other extensions are still skipped when their first block looks binary: a known magic
+# number, a null byte that is not part of UTF-16 text, or (when it is not UTF-8) more than
+# BINARY_CONTROL_RATIO control characters
+SNIFF_SIZE = 8192
+BINARY_CONTROL_RATIO = 0.05
+BINARY_MAGIC = (
+    b'PK\x03\x04', b'PK\x05\x06',           # zip, jar
+    b'\x1f\x8b', b'\xfd7zXZ\x00',            # gzip (nbt, dat), xz
+    b'\x89PNG', b'\xff\xd8\xff', b'\xca\xfe\xba\xbe', b'\x7fELF', b'SQLite format 3\x00',
+)
+# Magic numbers made of printable letters only count together with control characters,
+# a text file may well start with "MZ" or "RIFF"
+PRINTABLE_MAGIC = (b'BZh', b'GIF8', b'RIFF', b'OggS', b'ID3', b'fLaC', b'MZ', b'%PDF')
+TEXT_BOMS = (b'\xff\xfe', b'\xfe\xff', b'\x00\x00\xfe\xff')
+TEXT_BYTES = bytes([7, 8, 9, 10, 11, 12, 13, 27]) + bytes(range(0x20, 0x7f)) + bytes(range(0x80, 0x100))
+# Binary summary: files are cut into content-defined chunks where the top bits of a gear rolling hash
+# over the last 32 bytes are zero, so an insertion only changes the chunks around it. The hash only
+# runs after the minimum chunk size (chunks average about 20 KB) and a cut is forced at the maximum.
+# Files above CHUNK_FIXED_ABOVE are cut into fixed blocks instead, hashed without a Python loop
+BINARY_SUMMARY_NAME = 'binary_summary.jsonl'
+GEAR_BOUNDARY_MASK = 0xFFF00000
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 64 * 1024
+CHUNK_FIXED_ABOVE = 64 * 1024 * 1024
+_gear_rng = random.Random(25)
+GEAR_TABLE = [_gear_rng.getrandbits(32) for _ in range(256)]
+SKIP_EXTS = {'.png','.jpg','.jpeg','.gif','.mp3','.wav','.ogg','.mp4','.avi','.webm','.flac','.bmp','.tga','.ico'}
+
+def should_skip(file_path: str) -> bool:
+    _, ext = os.path.splitext(file_path.lower())
+    return ext in SKIP_EXTS
+
+def control_ratio_exceeded(block):
+    return len(block.translate(None, TEXT_BYTES)) > len(block) * BINARY_CONTROL_RATIO
+
+# UTF-16 text without a BOM: null bytes regularly at even (big endian) or only at odd (little endian)
+# offsets, and the decoded text has no more control characters than other text
+def utf16_text(block):
+    even_nulls = block[0::2].count(0)
+    odd_nulls = block[1::2].count(0)
+    # Spaces and line breaks alone give every 16th character or more a null byte
+    if (even_nulls and odd_nulls) or (even_nulls + odd_nulls) * 32 < len(block):
+        return False
+    block = block[:len(block) - len(block) % 2]
+    try:
+        text = block.decode('utf-16-be' if even_nulls else 'utf-16-le')
+    except UnicodeDecodeError as error:
+        if error.start < len(block) - 2:
+            return False
+        text = block[:error.start].decode('utf-16-be' if even_nulls else 'utf-16-le')
+    return not control_ratio_exceeded(text.encode('latin-1', 'replace'))
+
+def looks_binary(block):
+    if not block or block.startswith(TEXT_BOMS):
+        return False
+    if block.startswith(BINARY_MAGIC):
+        return True
+    if b'\x00' in block:
+        return not utf16_text(block)
+    if block.startswith(PRINTABLE_MAGIC) and control_ratio_exceeded(block):
+        return True
+    try:
+        block.decode('utf-8')
+        return False
+    except UnicodeDecodeError as error:
+        # A character cut in half at the end of the block is still UTF-8
+        if error.reason == 'unexpected end of data' and error.start >= len(block) - 3:
+            return False
+    # Latin-1 or cp1252 text has almost no control characters, binary data has plenty
+    return control_ratio_exceeded(block)
+
+# (path, mtime_ns) -> looks_binary of the first block, so no file is sniffed twice by the same process
+binary_cache = {}
+
+def is_binary(path):
+    key = (path, os.stat(path).st_mtime_ns)
+    binary = binary_cache.get(key)
+    if binary is None:
+        with open(path, 'rb') as f:
+            binary = binary_cache[key] = looks_binary(f.read(SNIFF_SIZE))
+    return binary
+
+# Either side of a pair looks binary, the snapshot already knows about the original
+def binary_pair(original_file, modified_file, snapshot_entry=None):
+    if snapshot_entry is not None:
+        if snapshot_entry[3]:
+            return True
+        sniffed = (modified_file,)
+    else:
+        sniffed = (original_file, modified_file)
+    return any(path is not None and os.path.exists(path) and is_binary(path) for path in sniffed)
+
+def path_key(rel_path):
+    return tuple(os.path.normcase(rel_path).split(os.sep))
+
+# Yield (path_key, relative path) for every file under root in path_key order, holding only
+# one sorted directory listing per level in memory. Like os.walk, symlinked folders are not entered
+def sorted_files(root):
+    def listing(names):
+        with os.scandir(os.path.join(root, *names)) as entries:
+            names = [(os.path.normcase(entry.name), entry.name, entry.is_dir())
+                     for entry in entries if not (entry.is_dir() and entry.is_symlink())]
+            return iter(sorted(names))
+
+    stack = [((), (), listing(()))]
+    while stack:
+        keys, names, entries = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+        key, name, is_dir = entry
+        if is_dir:
+            stack.append((keys + (key,), names + (name,), listing(names + (name,))))
+        else:
+            yield keys + (key,), os.path.join(*names, name)
+
+# Merge join of two sorted file streams: (original, modified) relative paths, None on the side that lacks the file
+def merge_files(original_files, modified_files):
+    original = next(original_files, None)
+    modified = next(modified_files, None)
+    while original is not None or modified is not None:
+        if modified is None or (original is not None and original[0] < modified[0]):
+            yield original[1], None
+            original = next(original_files, None)
+        elif original is None or modified[0] < original[0]:
+            yield None, modified[1]
+            modified = next(modified_files, None)
+        else:
+            yield original[1], modified[1]
+            original = next(original_files, None)
+            modified = next(modified_files, None)
+
+def hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COMPARE_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_entry(task):
+    root, rel_path = task
+    full_path = os.path.join(root, rel_path)
+    stat = os.stat(full_path)
+    return rel_path, [stat.st_size, stat.st_mtime_ns, hash_file(full_path), is_binary(full_path)]
+
+# Snapshot of the original tree: relative path -> [size, mtime_ns, blake2b of the content, looks binary]
+def build_snapshot(root, jobs):
+    tasks = ((root, rel_path) for _, rel_path in sorted_files(root))
+    if jobs == 1:
+        return dict(map(snapshot_entry, tasks))
+    with Pool(jobs) as pool:
+        return dict(pool.imap(snapshot_entry, tasks, chunksize=64))
+
+def load_snapshot(snapshot_path, root):
+    if not os.path.exists(snapshot_path):
+        return None
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('root') != root:
+        return None
+    return snapshot['files']
+
+def save_snapshot(snapshot_path, root, files):
+    temp_path = snapshot_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': SNAPSHOT_VERSION, 'root': root, 'files': files}, f, ensure_ascii=False)
+    os.replace(temp_path, snapshot_path)
+
+# The original folder can change after the snapshot was made. An entry whose size or mtime no longer
+# matches the file is dropped so the file itself is compared, and the status follows what is on disk
+def check_snapshot(original_file, entry, status, rel_path):
+    try:
+        stat = os.stat(original_file)
+    except OSError:
+        stat = None
+
+    if status == 'A':
+        if stat is None:
+            return None, status
+        print(f'Warning: {rel_path} is not in the snapshot but exists in the original folder, compared as modified')
+        return None, 'M'
+    if stat is None:
+        print(f'Warning: {rel_path} is in the snapshot but no longer in the original folder')
+        return None, 'A' if status in ('M', 'R') else None
+    if [stat.st_size, stat.st_mtime_ns] != entry[:2]:
+        print(f'Warning: {rel_path} changed since the snapshot was made, compared with the file on disk')
+        return None, status
+    return entry, status
+
+# Different sizes always differ, same size and mtime is taken as unchanged,
+# anything else is compared byte by byte and stops at the first different chunk.
+# With a snapshot entry of the original, only the modified file is read and its hash compared
+def same_content(original_file, modified_file, snapshot_entry=None):
+    mod_stat = os.stat(modified_file)
+    if snapshot_entry is not None:
+        size, mtime_ns, digest, _ = snapshot_entry
+        if size != mod_stat.st_size:
+            return False
+        return mtime_ns == mod_stat.st_mtime_ns or hash_file(modified_file) == digest
+
+    try:
+        orig_stat = os.stat(original_file)
+    except OSError:
+        return False
+    if orig_stat.st_size != mod_stat.st_size:
+        return False
+    if orig_stat.st_mtime_ns == mod_stat.st_mtime_ns:
+        return True
+
+    with open(original_file, 'rb') as orig, open(modified_file, 'rb') as mod:
+        while True:
+            orig_chunk = orig.read(COMPARE_CHUNK_SIZE)
+            if orig_chunk != mod.read(COMPARE_CHUNK_SIZE):
+                return False
+            if not orig_chunk:
+                return True
+
+def chunk_end(data, start):
+    end = min(start + CHUNK_MAX_SIZE, len(data))
+    begin = start + CHUNK_MIN_SIZE
+    if begin >= end:
+        return end
+    window = data[begin:end]
+    # Padding of one repeated byte would be hashed to the end anyway, cut it at the maximum right away
+    if window.count(window[:1]) == len(window):
+        return end
+    gear = GEAR_TABLE
+    rolling = 0
+    # The hash only depends on the last 32 bytes, so it is warmed up on the bytes just before begin
+    for byte in data[begin - 32:begin]:
+        rolling = ((rolling << 1) + gear[byte]) & 0xFFFFFFFF
+    for offset, byte in enumerate(window, begin + 1):
+        rolling = ((rolling << 1) + gear[byte]) & 0xFFFFFFFF
+        if not rolling & GEAR_BOUNDARY_MASK:
+            return offset
+    return end
+
+# blake2b digest -> total size of the chunks of the file with that content
+def content_chunks(path):
+    chunks = {}
+
+    def add(chunk):
+        digest = hashlib.blake2b(chunk, digest_size=16).digest()
+        chunks[digest] = chunks.get(digest, 0) + len(chunk)
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > CHUNK_FIXED_ABOVE:
+            for block in iter(lambda: f.read(CHUNK_MAX_SIZE), b''):
+                add(block)
+            return chunks
+
+        data = b''
+        start = 0
+        done = False
+        while True:
+            # Keep at least one maximum chunk ahead, only the unread part is copied on refill
+            if not done and len(data) - start < CHUNK_MAX_SIZE:
+                more = f.read(COMPARE_CHUNK_SIZE)
+                if more:
+                    data = data[start:] + more
+                    start = 0
+                    continue
+                done = True
+            if start >= len(data):
+                return chunks
+            end = chunk_end(data, start)
+            add(data[start:end])
+            start = end
+
+# Share of the bytes on either side that are in chunks missing from the other side, the larger of the
+# two, so added data and removed data both count
+def changed_ratio(original_file, modified_file):
+    original_chunks = content_chunks(original_file)
+    modified_chunks = content_chunks(modified_file)
+
+    def missing(chunks, other):
+        total = sum(chunks.values())
+        return sum(size for digest, size in chunks.items() if digest not in other) / total if total else 0.0
+
+    if not original_chunks or not modified_chunks:
+        return 1.0 if original_chunks or modified_chunks else 0.0
+    return max(missing(modified_chunks, original_chunks), missing(original_chunks, modified_chunks))
+
+def binary_summary(original_file, modified_file, snapshot_entry, rel_path):
+    original_size = os.path.getsize(original_file) if os.path.exists(original_file) else None
+    modified_size = os.path.getsize(modified_file) if modified_file is not None else None
+    if original_size is None:
+        status, ratio = 'added', 1.0
+    elif modified_size is None:
+        status, ratio = 'deleted', 1.0
+    elif same_content(original_file, modified_file, snapshot_entry):
+        status, ratio = 'unchanged', 0.0
+    else:
+        status, ratio = 'changed', changed_ratio(original_file, modified_file)
+    return {
+        'path': rel_path.replace(os.sep, '/'),
+        'status': status,
+        'original_size': original_size,
+        'modified_size': modified_size,
+        'size_delta': (modified_size or 0) - (original_size or 0),
+        'changed_ratio': round(ratio, 4),
+    }
+
+def sketch_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if looks_binary(data[:SNIFF_SIZE]):
+        return path, digest, None
+    shingles = {zlib.crc32(line.strip()) for line in data.split(b'\n') if line.strip()}
+    if not shingles:
+        return path, digest, None
+    signature = tuple(min((a * x + b) % MINHASH_PRIME for x in shingles) for a, b in MINHASH_PARAMS)
+    return path, digest, signature
+
+# Pair modified files that have no counterpart with original files that are gone from the modified
+# tree: same content hash first, otherwise the most similar signature among the LSH band candidates.
+# Sketches are made on pool when given, which must be called from the main thread
+def find_renames(unmatched_original, unmatched_modified, pool=None):
+    if not unmatched_modified or not unmatched_original:
+        return {}
+
+    if pool is None:
+        original_sketches = list(map(sketch_file, unmatched_original))
+        modified_sketches = list(map(sketch_file, unmatched_modified))
+    else:
+        original_sketches = pool.map(sketch_file, unmatched_original, chunksize=16)
+        modified_sketches = pool.map(sketch_file, unmatched_modified, chunksize=16)
+
+    rows = RENAME_PERMUTATIONS // RENAME_BANDS
+    by_digest = {}
+    bands = {}
+    for path, digest, signature in original_sketches:
+        by_digest.setdefault(digest, path)
+        if signature:
+            for band in range(RENAME_BANDS):
+                bands.setdefault((band, signature[band * rows:(band + 1) * rows]), []).append((path, signature))
+
+    renames = {}
+    for path, digest, signature in modified_sketches:
+        source = by_digest.get(digest)
+        if source is None and signature:
+            best = 0
+            checked = set()
+            for band in range(RENAME_BANDS):
+                for candidate, candidate_signature in bands.get((band, signature[band * rows:(band + 1) * rows]), ()):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    similarity = sum(x == y for x, y in zip(signature, candidate_signature)) / RENAME_PERMUTATIONS
+                    if similarity >= RENAME_SIMILARITY and similarity > best:
+                        source, best = candidate, similarity
+        if source is not None:
+            renames[path] = source
+    return renames
+
+# Longest run of (i, j) pairs, sorted by i, whose j also increases, found by patience sorting
+def increasing_anchors(candidates):
+    tails = []
+    tail_indexes = []
+    previous = [-1] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        pile = bisect.bisect_left(tails, j)
+        if pile:
+            previous[index] = tail_indexes[pile - 1]
+        if pile == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[pile] = j
+            tail_indexes[pile] = index
+    anchors = []
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index >= 0:
+        anchors.append(candidates[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+# Patience diff: anchor lines that keep their order on both sides (longest increasing subsequence)
+# are matched, the gaps between anchors are diffed the same way
+def patience_blocks(a, b):
+    blocks = []
+    regions = [(0, len(a), 0, len(b))]
+
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            blocks.append((alo, blo, 1))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            blocks.append((ahi, bhi, 1))
+        if alo == ahi or blo == bhi:
+            continue
+
+        # Anchor on the rarest lines found on both sides: unique lines when there are any, as in patience
+        # diff, otherwise (like histogram diff) the n-th copy of the rarest lines in a is paired with the n-th copy in b
+        positions = {}
+        for i in range(alo, ahi):
+            positions.setdefault(a[i], ([], []))[0].append(i)
+        for j in range(blo, bhi):
+            entry = positions.get(b[j])
+            if entry is not None:
+                entry[1].append(j)
+        rarest = min((max(len(a_positions), len(b_positions))
+                      for a_positions, b_positions in positions.values() if b_positions), default=0)
+        candidates = []
+        if rarest:
+            for a_positions, b_positions in positions.values():
+                if b_positions and max(len(a_positions), len(b_positions)) == rarest:
+                    candidates.extend(zip(a_positions, b_positions))
+            candidates.sort()
+        if not candidates:
+            if (ahi - alo) + (bhi - blo) <= PATIENCE_FALLBACK_LINES:
+                matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+                blocks.extend((alo + i, blo + j, size) for i, j, size in matcher.get_matching_blocks() if size)
+            continue
+
+        anchors = increasing_anchors(candidates)
+
+        last_i, last_j = alo, blo
+        for i, j in anchors:
+            blocks.append((i, j, 1))
+            regions.append((last_i, i, last_j, j))
+            last_i, last_j = i + 1, j + 1
+        regions.append((last_i, ahi, last_j, bhi))
+
+    blocks.sort()
+    merged = []
+    for i, j, size in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1][2] += size
+        else:
+            merged.append([i, j, size])
+    merged.append([len(a), len(b), 0])
+    return [tuple(block) for block in merged]
+
+class PatienceMatcher(difflib.SequenceMatcher):
+    def get_matching_blocks(self):
+        if self.matching_blocks is None:
+            self.matching_blocks = patience_blocks(self.a, self.b)
+        return self.matching_blocks
+
+def format_range(start, stop):
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+# Same output as difflib.unified_diff(..., lineterm=''), but with any SequenceMatcher
+def unified_diff(a, b, fromfile, tofile, matcher, n=3):
+    started = False
+    for group in matcher.get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield f'--- {fromfile}'
+            yield f'+++ {tofile}'
+
+        first, last = group[0], group[-1]
+        yield f'@@ -{format_range(first[1], last[2])} +{format_range(first[3], last[4])} @@'
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
+
+def read_lines(f, count):
+    lines = []
+    for line in f:
+        lines.append(line)
+        if len(lines) == count:
+            break
+    return lines
+
+# Opcodes of two files read STREAM_WINDOW_LINES at a time. Each window is cut after its last anchor, a
+# line found once in both windows, and only the part before the cut is diffed, the rest waits for the
+# next window. Opcodes carry their lines; equal runs longer than 2n keep only their first and last n lines
+def stream_opcodes(original, modified, engine, n):
+    a, b = [], []
+    a_offset = b_offset = 0
+    a_done = b_done = False
+
+    while True:
+        if not a_done and len(a) < STREAM_WINDOW_LINES:
+            more = read_lines(original, STREAM_WINDOW_LINES - len(a))
+            a_done = len(more) < STREAM_WINDOW_LINES - len(a)
+            a.extend(more)
+        if not b_done and len(b) < STREAM_WINDOW_LINES:
+            more = read_lines(modified, STREAM_WINDOW_LINES - len(b))
+            b_done = len(more) < STREAM_WINDOW_LINES - len(b)
+            b.extend(more)
+        if not a and not b:
+            return
+
+        a_cut, b_cut = len(a), len(b)
+        if not (a_done and b_done):
+            counts = {}
+            for line in a:
+                counts[line] = counts.get(line, 0) + 1
+            b_positions = {}
+            for j, line in enumerate(b):
+                if counts.get(line) == 1:
+                    b_positions[line] = -1 if line in b_positions else j
+            candidates = [(i, b_positions[line]) for i, line in enumerate(a) if b_positions.get(line, -1) >= 0]
+            anchors = increasing_anchors(candidates)
+            if anchors:
+                a_cut, b_cut = anchors[-1][0] + 1, anchors[-1][1] + 1
+
+        matcher_class = PatienceMatcher if engine == 'patience' else difflib.SequenceMatcher
+        matcher = matcher_class(None, a[:a_cut], b[:b_cut])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                lines = a[i1:i2] if i2 - i1 <= 2 * n else a[i1:i1 + n] + a[i2 - n:i2]
+            else:
+                lines = a[i1:i2] + b[j1:j2]
+            yield tag, a_offset + i1, a_offset + i2, b_offset + j1, b_offset + j2, lines
+
+        del a[:a_cut]
+        del b[:b_cut]
+        a_offset += a_cut
+        b_offset += b_cut
+
+# Same hunks as unified_diff, built from stream_opcodes without holding either file
+def stream_unified_diff(original_file, modified_file, engine, n=3):
+    with open(original_file, 'r', errors='ignore') as original, open(modified_file, 'r', errors='ignore') as modified:
+        # Equal runs split by a window cut are joined again first
+        def joined():
+            last = None
+            for code in stream_opcodes(original, modified, engine, n):
+                if last is not None and last[0] == 'equal' and code[0] == 'equal':
+                    lines = last[5] + code[5]
+                    if code[2] - last[1] > 2 * n:
+                        lines = lines[:n] + lines[-n:]
+                    last = ('equal', last[1], code[2], last[3], code[4], lines)
+                    continue
+                if last is not None:
+                    yield last
+                last = code
+            if last is not None:
+                yield last
+
+        # Grouping as in SequenceMatcher.get_grouped_opcodes, one group in memory at a time
+        def groups():
+            group = []
+            first = True
+            for tag, i1, i2, j1, j2, lines in joined():
+                if tag == 'equal' and first:
+                    i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+                    lines = lines[-(i2 - i1):] if i2 > i1 else []
+                first = False
+                if tag == 'equal' and i2 - i1 > 2 * n:
+                    group.append((tag, i1, i1 + n, j1, j1 + n, lines[:n]))
+                    yield group
+                    group = []
+                    i1, j1 = i2 - n, j2 - n
+                    lines = lines[-n:]
+                group.append((tag, i1, i2, j1, j2, lines))
+            if group and group[-1][0] == 'equal':
+                tag, i1, i2, j1, j2, lines = group[-1]
+                group[-1] = (tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n), lines[:n])
+            if group and not (len(group) == 1 and group[0][0] == 'equal'):
+                yield group
+
+        started = False
+        for group in groups():
+            if not started:
+                started = True
+                yield f'--- {original_file}'
+                yield f'+++ {modified_file}'
+
+            first, last = group[0], group[-1]
+            yield f'@@ -{format_range(first[1], last[2])} +{format_range(first[3], last[4])} @@'
+
+            for tag, i1, i2, j1, j2, lines in group:
+                if tag == 'equal':
+                    for line in lines:
+                        yield ' ' + line
+                    continue
+                for line in lines[:i2 - i1]:
+                    yield '-' + line
+                for line in lines[i2 - i1:]:
+                    yield '+' + line
+
+# Lines of the .cfc file, produced one at a time. With stream the two files are diffed window by window
+def compare_files(original_file, modified_file, engine='difflib', stream=False):
+    if modified_file is None:
+        with open(original_file, 'r', errors='ignore') as f:
+            for line in f:
+                yield '− ' + line.rstrip('\n')
+        return
+
+    if not os.path.exists(original_file):
+        with open(modified_file, 'r', errors='ignore') as f:
+            for line in f:
+                yield '+ ' + line.rstrip('\n')
+        return
+
+    if stream:
+        diff_lines = stream_unified_diff(original_file, modified_file, engine)
+    else:
+        with open(modified_file, 'r', errors='ignore') as f:
+            mod_lines = f.readlines()
+        with open(original_file, 'r', errors='ignore') as f:
+            orig_lines = f.readlines()
+        if engine == 'patience':
+            matcher = PatienceMatcher(None, orig_lines, mod_lines)
+        else:
+            matcher = difflib.SequenceMatcher(None, orig_lines, mod_lines)
+        diff_lines = unified_diff(orig_lines, mod_lines, original_file, modified_file, matcher)
+
+    for line in diff_lines:
+        if line.startswith('-') and not line.startswith('---'):
+            yield '−' + line[1:]
+        else:
+            yield line
+
+# Status letters: A added, D deleted, M modified, R moved or renamed
+def diff_pair(task):
+    orig_file, mod_file, out_path, engine, snapshot_entry, status, rel_path, stream_size, summarize_binary = task
+    if snapshot_entry is not None or status == 'A':
+        snapshot_entry, status = check_snapshot(orig_file, snapshot_entry, status, rel_path)
+        if status is None:
+            return None
+    if summarize_binary and (should_skip(rel_path) or binary_pair(orig_file, mod_file, snapshot_entry)):
+        return status, rel_path, binary_summary(orig_file, mod_file, snapshot_entry, rel_path)
+    # Moved files are reported even when their content is the same, only the .cfc file is left out
+    if mod_file is not None and same_content(orig_file, mod_file, snapshot_entry):
+        return (status, rel_path, None) if status == 'R' else None
+    # Binary files are listed with their status but not diffed
+    if should_skip(rel_path) or binary_pair(orig_file, mod_file, snapshot_entry):
+        return status, rel_path, None
+
+    sizes = [os.path.getsize(path) for path in (orig_file, mod_file) if path and os.path.exists(path)]
+    stream = stream_size is not None and max(sizes) > stream_size
+    # The output file is only created once the first line arrives, so unchanged files leave nothing behind
+    out = None
+    try:
+        for line in compare_files(orig_file, mod_file, engine, stream):
+            if out is None:
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                out = open(out_path, 'w', encoding='utf-8')
+            else:
+                out.write('\n')
+            out.write(line)
+    finally:
+        if out is not None:
+            out.close()
+
+    if out is None and status == 'M':
+        return None
+    return status, rel_path, None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_folder', help='Original folder')
+    parser.add_argument('-mo', '--modified_folder', required=True, help='Modified folder')
+    parser.add_argument('-o', '--output_folder', required=True, help='Output folder')
+    parser.add_argument('-e', '--engine', choices=DIFF_ENGINES, default='difflib',
+                        help='Diff algorithm, patience stays fast on big files with many repeated lines '
+                             '(default: difflib)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes, 0 uses all CPU cores (default: 1)')
+    parser.add_argument('-r', '--detect-renames', action='store_true',
+                        help='Compare renamed or moved files with the most similar original file '
+                             'that is no longer in the modified folder')
+    parser.add_argument('-d', '--deleted', action='store_true',
+                        help='Also write files deleted from the original folder as .cfc files with − lines, '
+                             'and list every added (A), deleted (D), moved (R) and modified (M) file')
+    parser.add_argument('-S', '--stream', type=float, metavar='MB',
+                        help='Diff text files bigger than this many MB window by window and write the .cfc file '
+                             'while reading, so memory use stays the same for any file size')
+    parser.add_argument('-b', '--binary-summary', action='store_true',
+                        help=f'Instead of skipping images, sounds and other binary files, write one line per file '
+                             f'to {BINARY_SUMMARY_NAME} in the output folder: changed, unchanged, added or deleted, '
+                             f'size change and the share of changed content')
+    parser.add_argument('-s', '--snapshot',
+                        help='Snapshot file of the original folder, created on the first run and reused '
+                             'instead of reading the original folder again')
+    args = parser.parse_args()
+
+    original_root = os.path.abspath(args.input_folder)
+    modified_root = os.path.abspath(args.modified_folder)
+    output_root = os.path.abspath(args.output_folder)
+    jobs = args.jobs or os.cpu_count()
+    stream_size = int(args.stream * 1024 * 1024) if args.stream is not None else None
+
+    snapshot = None
+    if args.snapshot:
+        snapshot = load_snapshot(args.snapshot, original_root)
+        if snapshot is None:
+            snapshot = build_snapshot(original_root, jobs)
+            save_snapshot(args.snapshot, original_root, snapshot)
+            print(f'Saved snapshot of {len(snapshot)} files to {args.snapshot}')
+        original_files = iter(sorted((path_key(rel_path), rel_path) for rel_path in snapshot))
+    else:
+        original_files = sorted_files(original_root)
+
+    def task(orig_rel, mod_rel, status):
+        orig_file = os.path.join(original_root, orig_rel or mod_rel)
+        mod_file = os.path.join(modified_root, mod_rel) if mod_rel else None
+        snapshot_entry = snapshot.get(orig_rel) if snapshot and orig_rel else None
+        rel_path = mod_rel or orig_rel
+        out_path = os.path.join(output_root, rel_path) + '.cfc'
+        return (orig_file, mod_file, out_path, args.engine, snapshot_entry, status, rel_path,
+                stream_size, args.binary_summary)
+
+    original_names = {}
+    added = []
+    deleted = []
+
+    # One sorted pass over both trees. Files on both sides are diffed right away; added and
+    # deleted files wait until the end, when every original file name is known for moved files
+    def walk_tasks():
+        for orig_rel, mod_rel in merge_files(original_files, sorted_files(modified_root)):
+            if orig_rel is not None:
+                original_names.setdefault(os.path.basename(orig_rel), []).append(orig_rel)
+            if mod_rel is None:
+                deleted.append(orig_rel)
+            elif should_skip(mod_rel) and not (args.binary_summary or args.deleted):
+                continue
+            elif orig_rel is None:
+                added.append(mod_rel)
+            else:
+                yield task(orig_rel, mod_rel, 'M')
+
+    # Built in the main thread once the walk is done: rename detection may use the pool itself,
+    # which would deadlock from inside a generator that the pool's own feeder thread is reading
+    def end_tasks(pool):
+        sources = {}
+        for mod_rel in added:
+            matches = original_names.get(os.path.basename(mod_rel), [])
+            if len(matches) == 1:
+                sources[mod_rel] = matches[0]
+
+        if args.detect_renames:
+            claimed = set(sources.values())
+            unmatched_original = [os.path.join(original_root, rel)
+                                  for rel in deleted if rel not in claimed and not should_skip(rel)]
+            unmatched_modified = [os.path.join(modified_root, rel)
+                                  for rel in added if rel not in sources and not should_skip(rel)]
+            for mod_file, orig_file in find_renames(unmatched_original, unmatched_modified, pool).items():
+                sources[os.path.relpath(mod_file, modified_root)] = os.path.relpath(orig_file, original_root)
+
+        tasks = [task(sources[mod_rel], mod_rel, 'R') if mod_rel in sources else task(None, mod_rel, 'A')
+                 for mod_rel in added]
+        if args.deleted:
+            claimed = set(sources.values())
+            tasks.extend(task(orig_rel, None, 'D') for orig_rel in deleted if orig_rel not in claimed)
+        return tasks
+
+    counts = {'A': 0, 'D': 0, 'M': 0, 'R': 0}
+    summaries = []
+
+    def report(result):
+        if not result:
+            return
+        status, rel_path, summary = result
+        if summary is not None:
+            summaries.append(summary)
+            if summary['status'] == 'unchanged' and status != 'R':
+                return
+        if args.deleted:
+            counts[status] += 1
+            print(f'{status} {rel_path}')
+
+    if jobs == 1:
+        for pair in walk_tasks():
+            report(diff_pair(pair))
+        for pair in end_tasks(None):
+            report(diff_pair(pair))
+    else:
+        # Workers write their .cfc files themselves, so results land on disk as soon as each pair is done
+        with Pool(jobs) as pool:
+            for result in pool.imap_unordered(diff_pair, walk_tasks(), chunksize=16):
+                report(result)
+            for result in pool.imap_unordered(diff_pair, end_tasks(pool), chunksize=16):
+                report(result)
+
+    if args.binary_summary:
+        summaries.sort(key=lambda summary: summary['path'])
+        os.makedirs(output_root, exist_ok=True)
+        summary_path = os.path.join(output_root, BINARY_SUMMARY_NAME)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            for summary in summaries:
+                f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        changed = sum(1 for summary in summaries if summary['status'] != 'unchanged')
+        print(f'Binary files: {changed} changed of {len(summaries)}, see {summary_path}')
+
+    if args.deleted:
+        print(f"Added: {counts['A']}, Deleted: {counts['D']}, Moved: {counts['R']}, Modified: {counts['M']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+from pathlib import Path
+
+EXTRACTORS_FOLDER = Path(__file__).resolve().parent.parent
+
+# Script, input file from GenerateConversations.py, whether it writes a single file instead of a folder
+EXTRACTORS = [
+    ("V1/ConversationsDecodeExtractor.py", "chatgpt.json", True),
+    ("V1/ConversationsDecodeExtractor2.py", "chatgpt.json", False),
+    ("V1/ConversationsDecodeExtractor3.py", "deepseek.json", True),
+    ("V1/ConversationsDecodeExtractor4.py", "deepseek.json", False),
+    ("V2/ConversationsExtractor.py", "deepseek.json", False),
+    ("V2/ConversationsExtractor2.py", "chatgpt.json", False),
+    ("V2/ConversationsExtractor2-OldFormat.py", "chatgpt_old.json", False),
+]
+
+def run_extractor(script, input_path, single_file, extra_args):
+    """Run one extractor in a child process and return (seconds, peak memory in MB or None, exit code)"""
+    with tempfile.TemporaryDirectory() as temp_folder:
+        output = os.path.join(temp_folder, "output.txt" if single_file else "output")
+        command = [sys.executable, str(EXTRACTORS_FOLDER / script), str(input_path), "-o", output] + extra_args
+
+        # stderr goes to a file: a child writing more than a pipe buffer would block while we wait for it
+        error_file = open(os.path.join(temp_folder, "stderr.txt"), "w+b")
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=error_file)
+        if hasattr(os, "wait4"):
+            # wait4 reports the resource usage of this child alone, not of every child so far
+            _, status, usage = os.wait4(process.pid, 0)
+            seconds = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in KB on Linux and in bytes on macOS
+            peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        else:
+            process.wait()
+            seconds = time.perf_counter() - start
+            peak_mb = None
+
+        error_file.seek(0)
+        error = error_file.read().decode("utf-8", "replace").strip()
+        error_file.close()
+        if process.returncode != 0 and error:
+            print(error.splitlines()[-1])
+
+    return seconds, peak_mb, process.returncode
+
+def accepts_args(script, extra_args):
+    """Whether every option in extra_args appears in the script's --help output"""
+    options = [arg.split("=", 1)[0] for arg in extra_args if arg.startswith("-")]
+    if not options:
+        return True
+    help_text = subprocess.run([sys.executable, str(EXTRACTORS_FOLDER / script), "--help"], capture_output=True, text=True).stdout
+    return all(option in help_text.split() or f"{option}," in help_text for option in options)
+
+def benchmark(data_folders, only, repeat, extra_args):
+    results = {}
+    scripts_with_args = {script for script, _, _ in EXTRACTORS if accepts_args(script, extra_args)}
+
+    for data_folder in data_folders:
+        data_folder = Path(data_folder)
+        print(f"Dataset: {data_folder}")
+        print(f"  {'Script':<42}{'Time (s)':>10}{'Peak memory (MB)':>18}")
+
+        for script, input_name, single_file in EXTRACTORS:
+            if only and not any(name in script for name in only):
+                continue
+
+            if script not in scripts_with_args:
+                print(f"  {script:<42}{'skipped, no ' + ' '.join(extra_args):>28}")
+                continue
+
+            input_path = data_folder / input_name
+            if not input_path.exists():
+                print(f"  {script:<42}{'skipped, no ' + input_name:>28}")
+                continue
+
+            best_seconds = None
+            peak_mb = None
+            exit_code = 0
+            for _ in range(repeat):
+                seconds, run_peak_mb, exit_code = run_extractor(script, input_path, single_file, extra_args)
+                if exit_code != 0:
+                    break
+                best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+                if run_peak_mb is not None:
+                    peak_mb = run_peak_mb if peak_mb is None else max(peak_mb, run_peak_mb)
+
+            key = f"{data_folder.name}/{script}"
+            if exit_code != 0:
+                print(f"  {script:<42}{'FAILED (exit ' + str(exit_code) + ')':>28}")
+                results[key] = {"failed": True}
+                continue
+
+            memory = f"{peak_mb:.1f}" if peak_mb is not None else "n/a"
+            print(f"  {script:<42}{best_seconds:>10.2f}{memory:>18}")
+            results[key] = {"seconds": best_seconds, "peak_mb": peak_mb}
+
+        print()
+
+    return results
+
+def compare_results(results, baseline, tolerance):
+    """Print every script that failed or got slower or bigger than the baseline by more than tolerance, return their count"""
+    regressions = 0
+
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None or before.get("failed"):
+            continue
+
+        if result.get("failed"):
+            print(f"REGRESSION {key}: failed, worked in the baseline")
+            regressions += 1
+            continue
+
+        for field, unit in (("seconds", "s"), ("peak_mb", " MB")):
+            old, new = before.get(field), result.get(field)
+            if old and new and new > old * (1 + tolerance):
+                print(f"REGRESSION {key}: {field} {old:.2f}{unit} -> {new:.2f}{unit} (+{(new / old - 1) * 100:.0f}%)")
+                regressions += 1
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile every V1 and V2 conversation extractor on generated data")
+    parser.add_argument("data", nargs="+", help="Folders created by GenerateConversations.py, e.g. one deep and one branchy dataset")
+    parser.add_argument("--only", action="append", help="Only run scripts whose path contains this text (can be repeated)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run every script this many times and keep the best time (default: 1)")
+    parser.add_argument("--args", default="", help="Extra arguments for the scripts, e.g. --args=\"--jobs 4\" (use = when they start with -), scripts whose --help does not list these options are skipped")
+    parser.add_argument("--save", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with results saved earlier with --save and exit with code 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or memory growth with --compare (default: 0.2 = 20%%)")
+
+    args = parser.parse_args()
+
+    results = benchmark(args.data, args.only, max(args.repeat, 1), args.args.split())
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Saved results to {args.save}")
+
+    failed = sum(1 for result in results.values() if result.get("failed"))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        print(f"{regressions} regressions compared to {args.compare}")
+        if regressions:
+            sys.exit(1)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import json
+import random
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+WORDS = (
+    "the of and to a in is it you that he was for on are with as I his they be at one have this from or had by "
+    "word but what some we can out other were all there when up use your how said an each she which do their time "
+    "if will way about many then them write would like so these her long make thing see him two has look more day "
+    "could go come did number sound no most people my over know water than call first who may down side been now "
+    "find any new work part take get place made live where after back little only round man year came show every "
+    "good me give our under name very through just form sentence great think say help low line differ turn cause "
+    "function return value list string class import error file python script output input folder branch message"
+).split()
+
+CODE_SNIPPET = "```python\ndef example(values):\n    return [value * 2 for value in values if value]\n```"
+
+def message_text(rng, words):
+    """Random text of about `words` words, sometimes with a code block like real assistant replies"""
+    count = max(1, int(rng.expovariate(1 / words)))
+    text = " ".join(rng.choices(WORDS, k=count)).capitalize() + "."
+    if count > 40 and rng.random() < 0.2:
+        text += "\n\n" + CODE_SNIPPET
+    return text
+
+def conversation_shape(rng, messages, branching, max_depth):
+    """Parent index of every node, node 0 being the empty root
+
+    The conversation grows along one path. With probability `branching` (or when the path reaches
+    max_depth) the next message is an edit or regeneration: a new sibling of a node on the path,
+    usually one of the last few.
+    """
+    parents = [-1]
+    depths = [0]
+    path = [0]
+
+    for node in range(1, messages + 1):
+        if len(path) > 1 and (rng.random() < branching or len(path) > max_depth):
+            cut = max(1, len(path) - 1 - int(rng.expovariate(1 / 4)))
+            del path[cut:]
+        parents.append(path[-1])
+        depths.append(len(path))
+        path.append(node)
+
+    return parents, depths
+
+def chatgpt_conversation(conv_id, title, parents, texts, times, children_only=False):
+    mapping = {}
+    node_ids = [f"{conv_id}-{node}" for node in range(len(parents))]
+
+    for node, parent in enumerate(parents):
+        entry = {"id": node_ids[node]}
+        if node == 0:
+            entry["message"] = None
+        else:
+            role, content_type, text = texts[node]
+            entry["message"] = {
+                "id": node_ids[node],
+                "author": {"role": role},
+                "create_time": times[node],
+                "content": {"content_type": content_type, "parts": [text]},
+            }
+        if not children_only or node == 0:
+            entry["parent"] = node_ids[parent] if parent >= 0 else None
+        entry["children"] = []
+        mapping[node_ids[node]] = entry
+
+    for node, parent in enumerate(parents):
+        if parent >= 0:
+            mapping[node_ids[parent]]["children"].append(node_ids[node])
+
+    return {
+        "title": title,
+        "create_time": times[0],
+        "update_time": times[-1],
+        "id": conv_id,
+        "conversation_id": conv_id,
+        "current_node": node_ids[-1],
+        "mapping": mapping,
+    }
+
+def deepseek_conversation(conv_id, title, parents, texts, times):
+    mapping = {"root": {"id": "root", "parent": None, "children": [], "message": None}}
+    node_ids = ["root"] + [str(node) for node in range(1, len(parents))]
+
+    for node in range(1, len(parents)):
+        role, _, text = texts[node]
+        inserted_at = datetime.fromtimestamp(times[node], timezone.utc).isoformat()
+        if role == "user":
+            fragments = [{"type": "REQUEST", "content": text}]
+        else:
+            fragments = [{"type": "THINK", "content": text[:len(text) // 3]}, {"type": "RESPONSE", "content": text}]
+        mapping[node_ids[node]] = {
+            "id": node_ids[node],
+            "parent": node_ids[parents[node]],
+            "children": [],
+            "message": {"model": "deepseek-chat", "inserted_at": inserted_at, "fragments": fragments},
+        }
+
+    for node in range(1, len(parents)):
+        mapping[node_ids[parents[node]]]["children"].append(node_ids[node])
+
+    return {
+        "id": conv_id,
+        "title": title,
+        "inserted_at": datetime.fromtimestamp(times[0], timezone.utc).isoformat(),
+        "updated_at": datetime.fromtimestamp(times[-1], timezone.utc).isoformat(),
+        "mapping": mapping,
+    }
+
+def generate(output_folder, conversations, size_mb, messages, branching, max_depth, words, seed):
+    rng = random.Random(seed)
+    files = {
+        "chatgpt": open(output_folder / "chatgpt.json", "w", encoding="utf-8"),
+        "chatgpt_old": open(output_folder / "chatgpt_old.json", "w", encoding="utf-8"),
+        "deepseek": open(output_folder / "deepseek.json", "w", encoding="utf-8"),
+    }
+    start_time = 1700000000.0
+    conv_index = 0
+
+    try:
+        for f in files.values():
+            f.write("[")
+
+        # Write one conversation at a time so multi-GB files never have to fit in memory
+        while (size_mb is None and conv_index < conversations) or (size_mb is not None and files["chatgpt"].tell() < size_mb * 1024 * 1024):
+            conv_id = f"conv-{seed}-{conv_index}"
+            title = " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).title()
+            node_count = max(1, int(rng.gauss(messages, messages / 4)))
+            parents, depths = conversation_shape(rng, node_count, branching, max_depth)
+
+            texts = [None]
+            times = [start_time]
+            for node in range(1, len(parents)):
+                role = "user" if depths[node] % 2 == 1 else "assistant"
+                content_type = "code" if role == "assistant" and rng.random() < 0.03 else "text"
+                texts.append((role, content_type, message_text(rng, words // 5 if role == "user" else words)))
+                times.append(times[-1] + rng.uniform(1, 120))
+            start_time = times[-1] + 3600
+
+            separator = "," if conv_index else ""
+            for name, conv in (
+                ("chatgpt", chatgpt_conversation(conv_id, title, parents, texts, times)),
+                ("chatgpt_old", chatgpt_conversation(conv_id, title, parents, texts, times, children_only=True)),
+                ("deepseek", deepseek_conversation(conv_id, title, parents, texts, times)),
+            ):
+                files[name].write(separator)
+                json.dump(conv, files[name], ensure_ascii=False)
+
+            conv_index += 1
+
+        for f in files.values():
+            f.write("]")
+    finally:
+        for f in files.values():
+            f.close()
+
+    return conv_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic ChatGPT and DeepSeek conversations.json files for benchmarking the extractors")
+    parser.add_argument("-o", "--output", help="Output folder", default="benchmark_data")
+    parser.add_argument("-n", "--conversations", type=int, default=100, help="Number of conversations (default: 100)")
+    parser.add_argument("--size", type=float, help="Keep adding conversations until chatgpt.json reaches this many MB (overrides --conversations)")
+    parser.add_argument("--messages", type=int, default=200, help="Average number of messages per conversation (default: 200)")
+    parser.add_argument("--branching", type=float, default=0.05, help="Chance that a message is an edit or regeneration starting a new branch (default: 0.05)")
+    parser.add_argument("--max-depth", type=int, default=1000000, help="Start a new branch whenever a path gets this deep (default: no limit)")
+    parser.add_argument("--words", type=int, default=120, help="Average words per assistant message, user messages get a fifth of that (default: 120)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, the same options and seed give the same files (default: 0)")
+
+    args = parser.parse_args()
+
+    output_folder = Path(args.output)
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    count = generate(output_folder, args.conversations, args.size, args.messages, args.branching, args.max_depth, args.words, args.seed)
+
+    print(f"Generated {count} conversations in '{output_folder}' folder:")
+    for name in ("chatgpt.json", "chatgpt_old.json", "deepseek.json"):
+        print(f"  {name}: {(output_folder / name).stat().st_size / (1024 * 1024):.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,40 @@
 import json
+import sys
 import argparse
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from conversation_tree import chatgpt_tree, iter_conversations, open_conversations, open_output
+
 def main():
     parser = argparse.ArgumentParser(description="Decode and extract ChatGPT conversations to a single TXT file")
-    parser.add_argument("input_json", help="Input JSON exported from ChatGPT")
-    parser.add_argument("-o", "--output", help="Output TXT file", default="output.txt")
+    parser.add_argument("input_json", help="Input JSON or export ZIP from ChatGPT")
+    parser.add_argument("-o", "--output", help="Output TXT file, compressed if it ends in .gz, .bz2, .xz or .zst", default="output.txt")
+    parser.add_argument("--stream", action="store_true", help="Parse the input one conversation at a time to keep memory usage low on large exports")
     args = parser.parse_args()
 
     input_path = Path(args.input_json)
     output_path = Path(args.output)
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    all_texts = []
     msg_counter = 0
 
-    for conv in data:
-        title = conv.get("title", "Untitled")
-        all_texts.append(f"===== {title} =====\n")
-
-        for item in conv.get("mapping", {}).values():
-            message = item.get("message")
-            if not message:
-                continue
+    with open_conversations(input_path) as f, open_output(output_path) as out:
+        conversations = iter_conversations(f) if args.stream else json.load(f)
+        separator = ""
 
-            content = message.get("content")
-            if not content:
-                continue
+        for conv in conversations:
+            title = conv.get("title", "Untitled")
+            out.write(f"{separator}===== {title} =====\n")
+            separator = "\n"
 
-            if content.get("content_type") == "text":
-                parts = content.get("parts", [])
-                if not parts:
-                    continue
-                role = message.get("author", {}).get("role", "")
-                role_label = "USER" if role == "user" else "ASSISTANT" if role == "assistant" else role.upper()
-
-                for part in parts:
+            tree = chatgpt_tree(conv.get("mapping", {}), include_system=True, skip_empty=False)
+            for messages in tree.messages:
+                for role, part in messages:
+                    role_label = "USER" if role == "user" else "ASSISTANT" if role == "assistant" else role.upper()
                     msg_counter += 1
-                    all_texts.append(f"[{msg_counter}] {role_label}: {part}\n")
-
-        all_texts.append("\n")
+                    out.write(f"\n[{msg_counter}] {role_label}: {part}\n")
 
-    output_text = "\n".join(all_texts)
-    with open(output_path, "w", encoding="utf-8") as out:
-        out.write(output_text)
+            out.write("\n\n")
 
     print(f"Done! Exported {msg_counter} messages to {output_path}")
 
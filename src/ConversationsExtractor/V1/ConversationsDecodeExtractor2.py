@@ -1,10 +1,14 @@
 import json
+import sys
 import argparse
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from conversation_tree import chatgpt_tree, open_conversations
+
 def main():
     parser = argparse.ArgumentParser(description="Decode and extract ChatGPT conversations to multiple TXT files")
-    parser.add_argument("input_json", help="Input JSON exported from ChatGPT")
+    parser.add_argument("input_json", help="Input JSON or export ZIP from ChatGPT")
     parser.add_argument("-o", "--output", help="Output folder", default="output_folder")
     args = parser.parse_args()
 
@@ -12,7 +16,7 @@ def main():
     output_folder = Path(args.output)
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    with open(input_path, "r", encoding="utf-8") as f:
+    with open_conversations(input_path) as f:
         data = json.load(f)
 
     for conv_index, conv in enumerate(data, start=1):
@@ -23,25 +27,12 @@ def main():
         lines = [f"===== {title} =====\n"]
         msg_counter = 0
 
-        for item in conv.get("mapping", {}).values():
-            message = item.get("message")
-            if not message:
-                continue
-
-            content = message.get("content")
-            if not content:
-                continue
-
-            if content.get("content_type") == "text":
-                parts = content.get("parts", [])
-                if not parts:
-                    continue
-                role = message.get("author", {}).get("role", "")
+        tree = chatgpt_tree(conv.get("mapping", {}), include_system=True, skip_empty=False)
+        for messages in tree.messages:
+            for role, part in messages:
                 role_label = "USER" if role == "user" else "ASSISTANT" if role == "assistant" else role.upper()
-
-                for part in parts:
-                    msg_counter += 1
-                    lines.append(f"[{msg_counter}] {role_label}: {part}\n")
+                msg_counter += 1
+                lines.append(f"[{msg_counter}] {role_label}: {part}\n")
 
         with open(file_path, "w", encoding="utf-8") as out:
             out.write("\n".join(lines))
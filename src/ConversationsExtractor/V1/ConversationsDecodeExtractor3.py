@@ -1,72 +1,55 @@
 import json
 import os
+import sys
 import argparse
-from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from conversation_tree import deepseek_tree, iter_conversations, open_conversations, open_output, role_label
 
 def extract_conversation_text(mapping):
     """Extract conversation text from DeepSeek's mapping structure"""
-    root_node = None
-    for node_id, node in mapping.items():
-        if node.get("parent") is None:
-            root_node = node
-            break
-    
-    if not root_node:
+    tree = deepseek_tree(mapping)
+    if not tree.roots:
         return []
-    
+
     messages = []
-    stack = deque(root_node.get("children", []))
-    
-    while stack:
-        node_id = stack.popleft()
-        node = mapping.get(node_id)
-        if not node:
-            continue
-        
-        if "children" in node:
-            stack.extendleft(reversed(node["children"]))
-        
-        message_data = node.get("message")
-        if message_data and "fragments" in message_data:
-            for fragment in message_data["fragments"]:
-                msg_type = fragment.get("type", "")
-                content = fragment.get("content", "")
-                
-                if content.strip():
-                    role = "USER" if msg_type == "REQUEST" else "ASSISTANT"
-                    messages.append(f"{role}: {content}")
-    
+    for node, depth in tree.preorder(tree.roots[0]):
+        if depth > 0:
+            for role, content in tree.messages[node]:
+                messages.append(f"{role_label(role)}: {content}")
+
     return messages
 
 def main():
     parser = argparse.ArgumentParser(
         description="Extract DeepSeek conversations from JSON to a single TXT file"
     )
-    parser.add_argument("input", help="JSON file path (e.g., conversations.json)")
+    parser.add_argument("input", help="JSON file or export ZIP path (e.g., conversations.json)")
     parser.add_argument("-o", "--output", default="deepseek_conversations.txt", 
-                       help="Output TXT filename")
+                       help="Output TXT filename, compressed if it ends in .gz, .bz2, .xz or .zst")
+    parser.add_argument("--stream", action="store_true",
+                       help="Parse the input one conversation at a time to keep memory usage low on large exports")
     args = parser.parse_args()
 
-    with open(args.input, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    exported_count = 0
+
+    with open_conversations(args.input) as f, open_output(args.output) as out:
+        conversations = iter_conversations(f) if args.stream else json.load(f)
+        separator = ""
+
+        for i, conv in enumerate(conversations, start=1):
+            title = conv.get("title", f"untitled_{i}")
+            mapping = conv.get("mapping", {})
 
-    all_conversations = []
+            messages = extract_conversation_text(mapping)
 
-    for i, conv in enumerate(data, start=1):
-        title = conv.get("title", f"untitled_{i}")
-        mapping = conv.get("mapping", {})
-        
-        messages = extract_conversation_text(mapping)
-        
-        if messages:
-            conversation_header = f"\n\n{'='*60}\n{i:03d}. {title}\n{'='*60}\n"
-            conversation_text = "\n\n".join(messages)
-            all_conversations.append(conversation_header + "\n" + conversation_text)
+            if messages:
+                out.write(f"{separator}\n\n{'='*60}\n{i:03d}. {title}\n{'='*60}\n\n")
+                out.write("\n\n".join(messages))
+                separator = "\n"
+                exported_count += 1
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        f.write("\n".join(all_conversations))
-    
-    print(f"Exported {len(all_conversations)} conversations to {args.output}")
+    print(f"Exported {exported_count} conversations to {args.output}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
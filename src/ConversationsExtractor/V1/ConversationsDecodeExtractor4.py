@@ -1,56 +1,38 @@
 import json
 import os
+import sys
 import argparse
 import re
-from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from conversation_tree import deepseek_tree, open_conversations, role_label
 
 def extract_conversation_text(mapping):
     """Extract conversation text from DeepSeek's mapping structure"""
-    root_node = None
-    for node_id, node in mapping.items():
-        if node.get("parent") is None:
-            root_node = node
-            break
-    
-    if not root_node:
+    tree = deepseek_tree(mapping)
+    if not tree.roots:
         return []
-    
+
     messages = []
-    stack = deque(root_node.get("children", []))
-    
-    while stack:
-        node_id = stack.popleft()
-        node = mapping.get(node_id)
-        if not node:
-            continue
-        
-        if "children" in node:
-            stack.extendleft(reversed(node["children"]))
-        
-        message_data = node.get("message")
-        if message_data and "fragments" in message_data:
-            for fragment in message_data["fragments"]:
-                msg_type = fragment.get("type", "")
-                content = fragment.get("content", "")
-                
-                if content.strip():
-                    role = "USER" if msg_type == "REQUEST" else "ASSISTANT"
-                    messages.append(f"{role}: {content}")
-    
+    for node, depth in tree.preorder(tree.roots[0]):
+        if depth > 0:
+            for role, content in tree.messages[node]:
+                messages.append(f"{role_label(role)}: {content}")
+
     return messages
 
 def main():
     parser = argparse.ArgumentParser(
         description="Extract DeepSeek conversations from JSON to multiple TXT files"
     )
-    parser.add_argument("input", help="JSON file path (e.g., conversations.json)")
+    parser.add_argument("input", help="JSON file or export ZIP path (e.g., conversations.json)")
     parser.add_argument("-o", "--output", default="deepseek_conversations", 
                        help="Output directory")
     args = parser.parse_args()
 
     os.makedirs(args.output, exist_ok=True)
 
-    with open(args.input, "r", encoding="utf-8") as f:
+    with open_conversations(args.input) as f:
         data = json.load(f)
 
     exported_count = 0
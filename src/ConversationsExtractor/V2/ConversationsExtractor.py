@@ -1,203 +1,194 @@
 import json
 import os
+import sys
 import argparse
 import re
-import sys
-
-def set_recursion_limit():
-    if '--limit' in sys.argv:
-        limit_index = sys.argv.index('--limit')
-        if limit_index + 1 < len(sys.argv):
-            try:
-                new_limit = int(sys.argv[limit_index + 1])
-                original_limit = sys.getrecursionlimit()
-                sys.setrecursionlimit(new_limit)
-                print(f"Recursion limit changed from {original_limit} to {new_limit}")
-            except ValueError:
-                print(f"Warning: Invalid recursion limit value, using default")
-    else:
-        sys.setrecursionlimit(10000)
-        print(f"Recursion limit set to: {sys.getrecursionlimit()}")
-
-set_recursion_limit()
-
-def extract_latest_conversation_text(mapping):
-    all_messages = []
-
-    current_node_id = 'root'
-
-    while current_node_id:
-        node = mapping.get(current_node_id)
-        if not node:
-            break
-
-        message_data = node.get("message")
-        if message_data and "fragments" in message_data:
-            for fragment in message_data["fragments"]:
-                msg_type = fragment.get("type", "")
-                content = fragment.get("content", "")
-
-                if content.strip():
-                    role = "USER" if msg_type == "REQUEST" else "ASSISTANT"
-                    all_messages.append(f"{role}: {content}")
-
-        children = node.get("children", [])
-        if not children:
-            break
-
-        best_child = None
-        best_depth = -1
+from multiprocessing import Pool
 
-        for child_id in children:
-            depth = count_descendants(mapping, child_id)
-            if depth > best_depth:
-                best_depth = depth
-                best_child = child_id
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from conversation_index import SearchIndex
+from conversation_manifest import MANIFEST_NAME, IncrementalExport
+from conversation_records import FORMATS, RecordWriter, message_records
+from conversation_tree import ESTIMATORS, ContextCounter, MessageInterner, deepseek_tree, open_conversations, role_label, write_messages
 
-        if best_child:
-            current_node_id = best_child
-        else:
-            current_node_id = children[-1]
-
-    return all_messages
-
-def count_descendants(mapping, node_id):
-    node = mapping.get(node_id)
-    if not node:
-        return 0
-
-    children = node.get("children", [])
-    if not children:
-        return 0
+def extract_latest_conversation_text(tree, counter):
+    if not tree.roots:
+        return []
 
-    count = len(children)
-    for child_id in children:
-        count += count_descendants(mapping, child_id)
-
-    return count
-
-def extract_all_conversation_text(mapping):
     all_messages = []
-    processed_nodes = set()
-
-    nodes_with_timestamps = []
-
-    def collect_all_nodes(node_id, depth=0):
-        if node_id in processed_nodes:
-            return
-        processed_nodes.add(node_id)
-
-        node = mapping.get(node_id)
-        if not node:
-            return
-
-        timestamp = None
-        message_data = node.get("message")
-        if message_data:
-            timestamp = message_data.get("inserted_at")
-
-        nodes_with_timestamps.append((node_id, depth, timestamp))
-
-        children = node.get("children", [])
-        for child_id in children:
-            collect_all_nodes(child_id, depth + 1)
-
-    collect_all_nodes('root')
-
-    nodes_with_timestamps.sort(key=lambda x: (x[1], x[2] if x[2] else ''))
-
-    role_counts = {}
-
-    for node_id, depth, timestamp in nodes_with_timestamps:
-        node = mapping.get(node_id)
-        if not node:
-            continue
-
-        message_data = node.get("message")
-        if message_data and "fragments" in message_data:
-            for fragment in message_data["fragments"]:
-                msg_type = fragment.get("type", "")
-                content = fragment.get("content", "")
-
-                if content.strip():
-                    role = "USER" if msg_type == "REQUEST" else "ASSISTANT"
-
-                    if depth not in role_counts:
-                        role_counts[depth] = {"USER": 0, "ASSISTANT": 0}
-
-                    role_counts[depth][role] += 1
-                    count = role_counts[depth][role]
-
-                    if count > 1:
-                        role_label = f"{role} {count}"
-                    else:
-                        role_label = role
-
-                    all_messages.append(f"{role_label}: {content}")
+    for node in tree.latest_path(tree.roots[0]):
+        for role, content in tree.messages[node]:
+            all_messages.append((role_label(role), content))
+            counter.add(role_label(role), content)
 
     return all_messages
 
-def count_contexts(messages):
-    if not messages:
-        return 0
+def full_history(tree, history):
+    role_counts = {}
 
-    text = "\n".join(messages)
-    chars = len(text)
-    contexts_k = chars // 1000
+    for node, depth in history:
+        for role, content in tree.messages[node]:
+            role = role_label(role)
+
+            if depth not in role_counts:
+                role_counts[depth] = {"USER": 0, "ASSISTANT": 0}
+
+            role_counts[depth][role] += 1
+            count = role_counts[depth][role]
+
+            if count > 1:
+                label = f"{role} {count}"
+            else:
+                label = role
+
+            yield label, content
+
+def conversation_file_name(conv, i):
+    title = conv.get("title", f"untitled_{i}")
+    safe_title = re.sub(r'[^\w\s-]', '', title)
+    safe_title = re.sub(r'[-\s]+', '_', safe_title).strip('_')
+    safe_title = safe_title[:50] or f"conversation_{i}"
+    return f"{i:03d}_{safe_title}.txt"
+
+def export_conversation(conv, i, filepath, collect_messages=False, estimator="chars", dedup=False):
+    title = conv.get("title", f"untitled_{i}")
+    tree = deepseek_tree(conv.get("mapping", {}))
+
+    main_counter = ContextCounter(estimator)
+    main_messages = extract_latest_conversation_text(tree, main_counter)
+
+    if not main_messages:
+        return None, None
+
+    # The merged order is only a list of node indexes; labels and text are produced again while writing
+    history = list(tree.history(tree.roots[0], lambda node, depth: (depth, tree.timestamps[node] or '')))
+
+    full_counter = ContextCounter(estimator)
+    for label, content in full_history(tree, history):
+        full_counter.add(label, content)
+
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(f"Title: {title}\n")
+        f.write(f"Main Messages: {len(main_messages)}\n")
+        f.write(f"Full Messages: {full_counter.messages}\n")
+        f.write(main_counter.header("Main") + "\n")
+        f.write(full_counter.header("Full") + "\n")
+        f.write("=" * 50 + "\n\n")
+        f.write("MAIN CONVERSATION (LATEST PATH):\n")
+        f.write("-" * 30 + "\n")
+        interner = MessageInterner() if dedup else None
+        write_messages(f, main_messages, interner)
+        f.write("\n\n" + "=" * 50 + "\n\n")
+        f.write("FULL HISTORY (ALL EDITS/REGENERATIONS):\n")
+        f.write("-" * 40 + "\n")
+        write_messages(f, full_history(tree, history), interner)
+
+    indexed = (title, list(full_history(tree, history))) if collect_messages else None
+    return filepath, indexed
+
+def export_conversation_task(task):
+    manifest_key, args = task
+    return manifest_key, export_conversation(*args)
+
+def conversation_records(conv, i):
+    tree = deepseek_tree(conv.get("mapping", {}))
+    if not tree.roots:
+        return []
+
+    root = tree.roots[0]
+    history = tree.history(root, lambda node, depth: (depth, tree.timestamps[node] or ''))
+    return list(message_records(tree, root, history, conv.get("id"), conv.get("title", f"untitled_{i}")))
+
+def conversation_records_task(task):
+    return conversation_records(*task)
+
+def export_records(data, output, record_format, jobs):
+    records_path = os.path.join(output, f"messages.{record_format}")
+    records = RecordWriter(records_path, timestamp_type="string")
+    tasks = ((conv, i) for i, conv in enumerate(data, start=1))
+
+    try:
+        if jobs == 1:
+            for task in tasks:
+                records.write(conversation_records(*task))
+        else:
+            # Every conversation is written as soon as it arrives instead of after all of them are done
+            with Pool(jobs or os.cpu_count()) as pool:
+                for conversation in pool.imap(conversation_records_task, tasks, chunksize=16):
+                    records.write(conversation)
+    finally:
+        records.close()
 
-    return contexts_k
+    print(f"Wrote {records.count} messages from {len(data)} conversations to {records_path}")
 
 def main():
     parser = argparse.ArgumentParser(description="Extract DeepSeek conversations to TXT files with main and full context counts")
-    parser.add_argument("input", help="JSON file path (e.g., conversations.json)")
+    parser.add_argument("input", help="JSON file or export ZIP path (e.g., conversations.json)")
     parser.add_argument("-o", "--output", default="deepseek_conversations", help="Output directory")
-    parser.add_argument("--limit", type=int, help="Set recursion limit for deep conversations")
+    parser.add_argument("--limit", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, 0 uses all CPU cores (default: 1)")
+    parser.add_argument("--incremental", action="store_true", help=f"Only export new or modified conversations, tracked in {MANIFEST_NAME} inside the output folder")
+    parser.add_argument("--index", help="Also build a full-text search index at this path (query it with ConversationsSearch.py)")
+    parser.add_argument("--dedup", action="store_true", help="Write every distinct message once and refer to it by number when it appears again, e.g. in the full history")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default="chars", help="How contexts are counted: chars (characters / 1000, default) or tokens (approximate token count with a per-role breakdown)")
+    parser.add_argument("--format", choices=FORMATS, default="txt", help="txt (default) writes one TXT file per conversation, jsonl or parquet write every message as one record to messages.jsonl or messages.parquet")
 
     args = parser.parse_args()
 
+    if args.format != "txt" and (args.incremental or args.index):
+        parser.error("--incremental and --index only work with --format txt")
+
     os.makedirs(args.output, exist_ok=True)
 
-    with open(args.input, "r", encoding="utf-8") as f:
+    with open_conversations(args.input) as f:
         data = json.load(f)
 
+    if args.format != "txt":
+        export_records(data, args.output, args.format, args.jobs)
+        return
+
+    incremental = IncrementalExport(args.output, conversation_file_name) if args.incremental else None
+    index = SearchIndex(args.index) if args.index else None
     exported_count = 0
 
-    for i, conv in enumerate(data, start=1):
-        title = conv.get("title", f"untitled_{i}")
-        mapping = conv.get("mapping", {})
-
-        main_messages = extract_latest_conversation_text(mapping)
-        full_messages = extract_all_conversation_text(mapping)
-
-        if not main_messages:
-            continue
-
-        main_contexts_k = count_contexts(main_messages)
-        full_contexts_k = count_contexts(full_messages)
-
-        safe_title = re.sub(r'[^\w\s-]', '', title)
-        safe_title = re.sub(r'[-\s]+', '_', safe_title).strip('_')
-        safe_title = safe_title[:50] or f"conversation_{i}"
-
-        filename = f"{i:03d}_{safe_title}.txt"
-        filepath = os.path.join(args.output, filename)
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(f"Title: {title}\n")
-            f.write(f"Main Messages: {len(main_messages)}\n")
-            f.write(f"Full Messages: {len(full_messages)}\n")
-            f.write(f"Main Contexts: {main_contexts_k}K\n")
-            f.write(f"Full Contexts: {full_contexts_k}K\n")
-            f.write("=" * 50 + "\n\n")
-            f.write("MAIN CONVERSATION (LATEST PATH):\n")
-            f.write("-" * 30 + "\n")
-            f.write("\n\n".join(main_messages))
-            f.write("\n\n" + "=" * 50 + "\n\n")
-            f.write("FULL HISTORY (ALL EDITS/REGENERATIONS):\n")
-            f.write("-" * 40 + "\n")
-            f.write("\n\n".join(full_messages))
-
-        exported_count += 1
+    def tasks():
+        for i, conv in enumerate(data, start=1):
+            if incremental is None:
+                yield None, (conv, i, os.path.join(args.output, conversation_file_name(conv, i)), bool(args.index), args.estimator, args.dedup)
+                continue
+
+            conv_id, version, filename = incremental.plan(conv, i)
+            if filename is None:
+                continue
+            yield (conv_id, version, filename), (conv, i, os.path.join(args.output, filename), bool(args.index), args.estimator, args.dedup)
+
+    def finish(manifest_key, result):
+        nonlocal exported_count
+        filepath, indexed = result
+        if filepath:
+            exported_count += 1
+        if indexed:
+            index.add(os.path.basename(filepath), *indexed)
+        if manifest_key:
+            incremental.record(manifest_key, filepath is not None)
+
+    try:
+        if args.jobs == 1:
+            for manifest_key, task in tasks():
+                finish(manifest_key, export_conversation(*task))
+        else:
+            # Every conversation is indexed and recorded in the manifest as soon as it arrives instead of after all of them are done
+            with Pool(args.jobs or os.cpu_count()) as pool:
+                for manifest_key, result in pool.imap(export_conversation_task, tasks(), chunksize=16):
+                    finish(manifest_key, result)
+    finally:
+        if incremental is not None:
+            incremental.save()
+        if index is not None:
+            index.close()
+
+    if incremental is not None:
+        print(f"Skipped {incremental.unchanged_count} unchanged conversations")
 
     print(f"Exported {exported_count} conversations to '{args.output}' folder")
     print("Main Contexts: Latest conversation path only")
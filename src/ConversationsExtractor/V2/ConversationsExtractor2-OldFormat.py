@@ -1,178 +1,65 @@
 import json
+import sys
 import argparse
 from pathlib import Path
-import sys
 
-def set_recursion_limit():
-    """Set recursion limit based on command line argument if provided"""
-    if '--limit' in sys.argv:
-        limit_index = sys.argv.index('--limit')
-        if limit_index + 1 < len(sys.argv):
-            try:
-                new_limit = int(sys.argv[limit_index + 1])
-                original_limit = sys.getrecursionlimit()
-                sys.setrecursionlimit(new_limit)
-                print(f"Recursion limit changed from {original_limit} to {new_limit}")
-            except ValueError:
-                print(f"Warning: Invalid recursion limit value, using default")
-    else:
-        sys.setrecursionlimit(10000)
-        print(f"Recursion limit set to: {sys.getrecursionlimit()}")
-
-set_recursion_limit()
-
-def extract_chatgpt_conversations(mapping):
-    """Extract both main (latest) and full conversations from ChatGPT mapping"""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from conversation_tree import ESTIMATORS, ContextCounter, chatgpt_children_tree, open_conversations, role_label
+
+def extract_chatgpt_conversations(mapping, main_counter, full_counter):
+    """Extract both main (latest) and full conversations from ChatGPT mapping, counting them as they are extracted"""
     main_messages = []
     full_messages = []
 
+    # The full history keeps messages of any content type, the main path only text ones. Tree nodes are numbered in mapping order
+    tree = chatgpt_children_tree(mapping, text_only=False)
+    if not tree.roots:
+        return main_messages, full_messages
+
+    text_nodes = [((node.get("message") or {}).get("content") or {}).get("content_type") == "text" for node in mapping.values()]
+    root = tree.roots[0]
+
+    for node in tree.latest_path(root):
+        if not text_nodes[node]:
+            continue
+        for role, part in tree.messages[node]:
+            main_messages.append(f"{role_label(role)}: {part}")
+            main_counter.add(role_label(role), part)
+
     role_counts = {}
 
-    def follow_latest_path(node_id):
-        """Follow the path that continues the conversation"""
-        node = mapping.get(node_id)
-        if not node:
-            return
-
-        message = node.get("message")
-        if message and should_include_message(message):
-            author_role = message.get("author", {}).get("role", "")
-            content_parts = get_meaningful_content(message)
-
-            if content_parts:
-                role_label = "USER" if author_role == "user" else "ASSISTANT"
-                for part in content_parts:
-                    main_messages.append(f"{role_label}: {part}")
-
-        children = node.get("children", [])
-        if not children:
-            return
-
-        best_child = None
-        best_depth = -1
-
-        for child_id in children:
-            depth = count_descendants(mapping, child_id)
-            if depth > best_depth:
-                best_depth = depth
-                best_child = child_id
-
-        if best_child:
-            follow_latest_path(best_child)
+    for node, depth in tree.history(root, lambda node, depth: (depth, tree.timestamps[node] or 0)):
+        if depth not in role_counts:
+            role_counts[depth] = {"USER": 0, "ASSISTANT": 0}
+
+        role_base = role_label(tree.messages[node][0][0])
+        role_counts[depth][role_base] += 1
+        count = role_counts[depth][role_base]
+
+        if count > 1:
+            label = f"{role_base} {count}"
         else:
-            follow_latest_path(children[-1])
-
-    def count_descendants(mapping, node_id):
-        """Count how many descendants a node has"""
-        node = mapping.get(node_id)
-        if not node:
-            return 0
-
-        children = node.get("children", [])
-        if not children:
-            return 0
-
-        count = len(children)
-        for child_id in children:
-            count += count_descendants(mapping, child_id)
-
-        return count
-
-    def extract_all_messages(node_id, depth=0):
-        """Extract all messages including branches for full conversation"""
-        all_nodes = []
-
-        def collect_nodes(node_id, depth=0):
-            node = mapping.get(node_id)
-            if not node:
-                return
-
-            message = node.get("message")
-            if message:
-                timestamp = message.get("create_time")
-                author_role = message.get("author", {}).get("role", "")
-                content_parts = get_meaningful_content(message)
-
-                if author_role != "system" and content_parts:
-                    all_nodes.append((depth, timestamp, author_role, content_parts))
-
-            children = node.get("children", [])
-            for child_id in children:
-                collect_nodes(child_id, depth + 1)
-
-        collect_nodes(node_id, depth)
-
-        all_nodes.sort(key=lambda x: (x[0], x[1] if x[1] else 0))
-
-        role_counts = {}
-
-        for depth, timestamp, author_role, content_parts in all_nodes:
-            if depth not in role_counts:
-                role_counts[depth] = {"USER": 0, "ASSISTANT": 0}
-
-            role_base = "USER" if author_role == "user" else "ASSISTANT"
-            role_counts[depth][role_base] += 1
-            count = role_counts[depth][role_base]
-
-            if count > 1:
-                role_label = f"{role_base} {count}"
-            else:
-                role_label = role_base
-            
-            for part in content_parts:
-                full_messages.append(f"{role_label}: {part}")
-    
-    def should_include_message(message):
-        """Check if message should be included in output"""
-        author_role = message.get("author", {}).get("role", "")
-        if author_role == "system":
-            return False
-        
-        content = message.get("content")
-        if not content or content.get("content_type") != "text":
-            return False
-        
-        parts = content.get("parts", [])
-        meaningful_parts = [part for part in parts if part and str(part).strip()]
-        return len(meaningful_parts) > 0
-    
-    def get_meaningful_content(message):
-        """Extract meaningful content parts from message"""
-        content = message.get("content", {})
-        parts = content.get("parts", [])
-        return [part for part in parts if part and str(part).strip()]
-
-    root_node = next((node for node in mapping.values() if node.get("parent") is None), None)
-    if root_node:
-        root_id = root_node.get("id")
-        follow_latest_path(root_id)
-        extract_all_messages(root_id)
-    
-    return main_messages, full_messages
+            label = role_base
 
-def count_contexts(messages):
-    """Count characters and convert to K contexts"""
-    if not messages:
-        return 0
-    
-    text = "\n".join(messages)
-    chars = len(text)
-    contexts_k = chars // 1000
-    
-    return contexts_k
+        for _, part in tree.messages[node]:
+            full_messages.append(f"{label}: {part}")
+            full_counter.add(label, part)
+
+    return main_messages, full_messages
 
 def main():
     parser = argparse.ArgumentParser(description="Extract ChatGPT conversations with context counting")
-    parser.add_argument("input_json", help="Input JSON exported from ChatGPT")
+    parser.add_argument("input_json", help="Input JSON or export ZIP from ChatGPT")
     parser.add_argument("-o", "--output", help="Output folder", default="chatgpt_conversations")
-    parser.add_argument("--limit", type=int, help="Set recursion limit for deep conversations")
+    parser.add_argument("--limit", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--estimator", choices=ESTIMATORS, default="chars", help="How contexts are counted: chars (characters / 1000, default) or tokens (approximate token count with a per-role breakdown)")
     args = parser.parse_args()
 
     input_path = Path(args.input_json)
     output_folder = Path(args.output)
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    with open(input_path, "r", encoding="utf-8") as f:
+    with open_conversations(input_path) as f:
         data = json.load(f)
 
     for conv_index, conv in enumerate(data, start=1):
@@ -181,20 +68,19 @@ def main():
         file_path = output_folder / f"{conv_index:03d}_{safe_title}.txt"
 
         mapping = conv.get("mapping", {})
-        main_messages, full_messages = extract_chatgpt_conversations(mapping)
+        main_counter = ContextCounter(args.estimator)
+        full_counter = ContextCounter(args.estimator)
+        main_messages, full_messages = extract_chatgpt_conversations(mapping, main_counter, full_counter)
         
         if not main_messages:
             continue
 
-        main_contexts_k = count_contexts(main_messages)
-        full_contexts_k = count_contexts(full_messages)
-
         with open(file_path, "w", encoding="utf-8") as out:
             out.write(f"Title: {title}\n")
             out.write(f"Main Messages: {len(main_messages)}\n")
             out.write(f"Full Messages: {len(full_messages)}\n")
-            out.write(f"Main Contexts: {main_contexts_k}K\n")
-            out.write(f"Full Contexts: {full_contexts_k}K\n")
+            out.write(main_counter.header("Main") + "\n")
+            out.write(full_counter.header("Full") + "\n")
             out.write("=" * 50 + "\n\n")
             out.write("MAIN CONVERSATION (LATEST PATH):\n")
             out.write("-" * 30 + "\n")
@@ -205,8 +91,8 @@ def main():
             out.write("\n\n".join(full_messages))
 
         print(f"Exported: {file_path}")
-        print(f"  Main: {len(main_messages)} messages, {main_contexts_k}K contexts")
-        print(f"  Full: {len(full_messages)} messages, {full_contexts_k}K contexts")
+        print(f"  Main: {len(main_messages)} messages, {main_counter.summary()}")
+        print(f"  Full: {len(full_messages)} messages, {full_counter.summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,225 +1,191 @@
 import json
+import os
+import sys
 import argparse
+from collections import deque
+from multiprocessing import Pool
 from pathlib import Path
-import sys
-
-def set_recursion_limit():
-    if '--limit' in sys.argv:
-        limit_index = sys.argv.index('--limit')
-        if limit_index + 1 < len(sys.argv):
-            try:
-                new_limit = int(sys.argv[limit_index + 1])
-                original_limit = sys.getrecursionlimit()
-                sys.setrecursionlimit(new_limit)
-                print(f"Recursion limit changed from {original_limit} to {new_limit}")
-            except ValueError:
-                print(f"Warning: Invalid recursion limit value, using default")
-    else:
-        sys.setrecursionlimit(10000)
-        print(f"Recursion limit set to: {sys.getrecursionlimit()}")
-
-set_recursion_limit()
-
-def find_children(mapping, parent_id):
-    children = []
-    for node_id, node in mapping.items():
-        if node.get("parent") == parent_id:
-            children.append(node_id)
-    return children
-
-def should_include_message(message):
-    author_role = message.get("author", {}).get("role", "")
-    if author_role == "system":
-        return False
 
-    content = message.get("content")
-    if not content:
-        return False
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from conversation_index import SearchIndex
+from conversation_manifest import MANIFEST_NAME, IncrementalExport
+from conversation_records import FORMATS, RecordWriter, message_records
+from conversation_tree import ESTIMATORS, ContextCounter, MessageInterner, chatgpt_tree, iter_conversations, open_conversations, role_label, write_messages
 
-    if isinstance(content, str):
-        return content.strip() != ""
+def conversation_file_name(conv, conv_index):
+    title = conv.get("title", f"Conversation_{conv_index}")
+    safe_title = "".join(c for c in title if c.isalnum() or c in (" ", "_", "-")).rstrip()
+    return f"{conv_index:03d}_{safe_title}.txt"
 
-    if content.get("content_type") != "text":
-        return False
+def full_history(tree, history):
+    role_counters = {"USER": 0, "ASSISTANT": 0}
+    last_role = None
 
-    parts = content.get("parts", [])
-    meaningful_parts = [part for part in parts if part and str(part).strip()]
-    return len(meaningful_parts) > 0
-
-def get_meaningful_content(message):
-    content = message.get("content")
-    if not content:
-        return []
-
-    if isinstance(content, str):
-        return [content] if content.strip() else []
+    for node, _ in history:
+        for role, content in tree.messages[node]:
+            role = role_label(role)
+            role_counters[role] += 1
+            count = role_counters[role]
 
-    parts = content.get("parts", [])
-    return [part for part in parts if part and str(part).strip()]
+            if count > 1 and last_role == role:
+                label = f"{role} {count}"
+            else:
+                label = role
 
-def count_contexts(messages):
-    if not messages:
-        return 0
+            yield label, content
+            last_role = role
 
-    text = "\n".join(messages)
-    chars = len(text)
-    contexts_k = chars // 1000
-    return contexts_k
+def export_conversation(conv, conv_index, file_path, collect_messages=False, estimator="chars", dedup=False):
+    title = conv.get("title", f"Conversation_{conv_index}")
+
+    tree = chatgpt_tree(conv.get("mapping", {}))
+    if not tree.roots:
+        return None, f"Skipping conversation {conv_index}: No root node found", None
+
+    root = tree.roots[0]
+
+    main_messages = []
+    main_counter = ContextCounter(estimator)
+    for node in tree.latest_path(root):
+        for role, part in tree.messages[node]:
+            main_messages.append((role_label(role), part))
+            main_counter.add(role_label(role), part)
+
+    if not main_messages:
+        return None, f"Skipping conversation {conv_index}: No meaningful messages", None
+
+    # The merged order is only a list of node indexes; labels and text are produced again while writing
+    history = list(tree.history(root, lambda node, depth: tree.timestamps[node] or 0))
+
+    full_counter = ContextCounter(estimator)
+    for label, content in full_history(tree, history):
+        full_counter.add(label, content)
+
+    with open(file_path, "w", encoding="utf-8") as out:
+        out.write(f"Title: {title}\n")
+        out.write(f"Main Messages: {len(main_messages)}\n")
+        out.write(f"Full Messages: {full_counter.messages}\n")
+        out.write(main_counter.header("Main") + "\n")
+        out.write(full_counter.header("Full") + "\n")
+        out.write("=" * 50 + "\n\n")
+        out.write("MAIN CONVERSATION (LATEST PATH):\n")
+        out.write("-" * 30 + "\n")
+        interner = MessageInterner() if dedup else None
+        write_messages(out, main_messages, interner)
+        out.write("\n\n" + "=" * 50 + "\n\n")
+        out.write("FULL HISTORY (ALL BRANCHES):\n")
+        out.write("-" * 25 + "\n")
+        write_messages(out, full_history(tree, history), interner)
+
+    report = "\n".join([
+        f"Exported: {file_path}",
+        f"  Main: {len(main_messages)} messages, {main_counter.summary()}",
+        f"  Full: {full_counter.messages} messages, {full_counter.summary()}",
+    ])
+    indexed = (title, list(full_history(tree, history))) if collect_messages else None
+    return file_path, report, indexed
+
+def conversation_records(conv, conv_index):
+    title = conv.get("title", f"Conversation_{conv_index}")
+
+    tree = chatgpt_tree(conv.get("mapping", {}))
+    if not tree.roots:
+        return f"Skipping conversation {conv_index}: No root node found", []
+
+    root = tree.roots[0]
+    history = tree.history(root, lambda node, depth: tree.timestamps[node] or 0)
+    records = list(message_records(tree, root, history, conv.get("id") or conv.get("conversation_id"), title))
+    return f"Converted: {title} ({len(records)} messages)", records
+
+def export_conversations(conversations, output_folder, jobs, incremental=None, index=None, estimator="chars", dedup=False, records=None):
+    worker = export_conversation if records is None else conversation_records
+
+    def tasks():
+        for conv_index, conv in enumerate(conversations, start=1):
+            if records is not None:
+                yield None, (conv, conv_index)
+                continue
+
+            if incremental is None:
+                yield None, (conv, conv_index, output_folder / conversation_file_name(conv, conv_index), index is not None, estimator, dedup)
+                continue
+
+            conv_id, version, file_name = incremental.plan(conv, conv_index)
+            if file_name is None:
+                continue
+            yield (conv_id, version, file_name), (conv, conv_index, output_folder / file_name, index is not None, estimator, dedup)
+
+    def finish(manifest_key, result):
+        if records is not None:
+            report, conversation = result
+            print(report)
+            records.write(conversation)
+            return
+
+        file_path, report, indexed = result
+        print(report)
+        if indexed:
+            index.add(file_path.name, *indexed)
+        if manifest_key:
+            incremental.record(manifest_key, file_path is not None)
+
+    if jobs == 1:
+        for manifest_key, task in tasks():
+            finish(manifest_key, worker(*task))
+    else:
+        # Keep a bounded window of pending results so --stream still holds only a few conversations in memory
+        with Pool(jobs) as pool:
+            pending = deque()
+            for manifest_key, task in tasks():
+                pending.append((manifest_key, pool.apply_async(worker, task)))
+                if len(pending) >= jobs * 4:
+                    manifest_key, result = pending.popleft()
+                    finish(manifest_key, result.get())
+            while pending:
+                manifest_key, result = pending.popleft()
+                finish(manifest_key, result.get())
+
+    if incremental is not None:
+        print(f"Skipped {incremental.unchanged_count} unchanged conversations")
 
 def main():
     parser = argparse.ArgumentParser(description="Extract ChatGPT conversations to TXT files with main and full context counts")
-    parser.add_argument("input_json", help="Input JSON exported from ChatGPT")
+    parser.add_argument("input_json", help="Input JSON or export ZIP from ChatGPT")
     parser.add_argument("-o", "--output", help="Output folder", default="chatgpt_conversations")
-    parser.add_argument("--limit", type=int, default=10000, help="Recursion limit for deep conversations (default: 10000)")
+    parser.add_argument("--limit", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--stream", action="store_true", help="Parse the input one conversation at a time to keep memory usage low on large exports")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, 0 uses all CPU cores (default: 1)")
+    parser.add_argument("--incremental", action="store_true", help=f"Only export new or modified conversations, tracked in {MANIFEST_NAME} inside the output folder")
+    parser.add_argument("--index", help="Also build a full-text search index at this path (query it with ConversationsSearch.py)")
+    parser.add_argument("--dedup", action="store_true", help="Write every distinct message once and refer to it by number when it appears again, e.g. in the full history")
+    parser.add_argument("--estimator", choices=ESTIMATORS, default="chars", help="How contexts are counted: chars (characters / 1000, default) or tokens (approximate token count with a per-role breakdown)")
+    parser.add_argument("--format", choices=FORMATS, default="txt", help="txt (default) writes one TXT file per conversation, jsonl or parquet write every message as one record to messages.jsonl or messages.parquet")
 
     args = parser.parse_args()
 
+    if args.format != "txt" and (args.incremental or args.index):
+        parser.error("--incremental and --index only work with --format txt")
+
     input_path = Path(args.input_json)
     output_folder = Path(args.output)
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    for conv_index, conv in enumerate(data, start=1):
-        title = conv.get("title", f"Conversation_{conv_index}")
-        safe_title = "".join(c for c in title if c.isalnum() or c in (" ", "_", "-")).rstrip()
-        file_path = output_folder / f"{conv_index:03d}_{safe_title}.txt"
-
-        mapping = conv.get("mapping", {})
-
-        main_messages = []
-        full_messages = []
-
-        all_nodes = []
-
-        def count_descendants(node_id):
-            children = find_children(mapping, node_id)
-            if not children:
-                return 0
-
-            count = len(children)
-            for child_id in children:
-                count += count_descendants(child_id)
-            return count
-
-        def follow_latest_path(node_id):
-            node = mapping.get(node_id)
-            if not node:
-                return
-
-            message = node.get("message")
-            if message and should_include_message(message):
-                author_role = message.get("author", {}).get("role", "")
-                content_parts = get_meaningful_content(message)
-
-                if content_parts:
-                    role_label = "USER" if author_role == "user" else "ASSISTANT"
-                    for part in content_parts:
-                        main_messages.append(f"{role_label}: {part}")
-
-            children = find_children(mapping, node_id)
-            if not children:
-                return
-
-            if len(children) == 1:
-                follow_latest_path(children[0])
-                return
-
-            best_child = None
-            best_depth = -1
-
-            for child_id in children:
-                depth = count_descendants(child_id)
-                if depth > best_depth:
-                    best_depth = depth
-                    best_child = child_id
-
-            if best_child:
-                follow_latest_path(best_child)
-            else:
-                follow_latest_path(children[-1])
-
-        def collect_all_nodes(node_id, depth=0):
-            node = mapping.get(node_id)
-            if not node:
-                return
-
-            message = node.get("message")
-            if message and should_include_message(message):
-                author_role = message.get("author", {}).get("role", "")
-                content_parts = get_meaningful_content(message)
-
-                if content_parts:
-                    timestamp = message.get("create_time", 0)
-                    role = "USER" if author_role == "user" else "ASSISTANT"
-                    for part in content_parts:
-                        all_nodes.append((timestamp, role, part))
-
-            children = find_children(mapping, node_id)
-            for child_id in children:
-                collect_all_nodes(child_id, depth + 1)
-
-        root_node = None
-        for node_id, node in mapping.items():
-            if node.get("parent") is None:
-                root_node = node
-                break
-
-        if not root_node:
-            print(f"Skipping conversation {conv_index}: No root node found")
-            continue
-
-        root_id = root_node.get("id")
-
-        follow_latest_path(root_id)
-
-        collect_all_nodes(root_id)
-
-        all_nodes.sort(key=lambda x: x[0] if x[0] else 0)
-
-        role_counters = {"USER": 0, "ASSISTANT": 0}
-        last_role = None
-
-        for timestamp, role, content in all_nodes:
-            role_counters[role] += 1
-            count = role_counters[role]
-
-            if count > 1 and last_role == role:
-                role_label = f"{role} {count}"
-            else:
-                role_label = role
-                if last_role != role:
-                    pass
-
-            full_messages.append(f"{role_label}: {content}")
-            last_role = role
-
-        if not main_messages:
-            print(f"Skipping conversation {conv_index}: No meaningful messages")
-            continue
-
-        main_contexts_k = count_contexts(main_messages)
-        full_contexts_k = count_contexts(full_messages)
-
-        with open(file_path, "w", encoding="utf-8") as out:
-            out.write(f"Title: {title}\n")
-            out.write(f"Main Messages: {len(main_messages)}\n")
-            out.write(f"Full Messages: {len(full_messages)}\n")
-            out.write(f"Main Contexts: {main_contexts_k}K\n")
-            out.write(f"Full Contexts: {full_contexts_k}K\n")
-            out.write("=" * 50 + "\n\n")
-            out.write("MAIN CONVERSATION (LATEST PATH):\n")
-            out.write("-" * 30 + "\n")
-            out.write("\n\n".join(main_messages))
-            out.write("\n\n" + "=" * 50 + "\n\n")
-            out.write("FULL HISTORY (ALL BRANCHES):\n")
-            out.write("-" * 25 + "\n")
-            out.write("\n\n".join(full_messages))
-
-        print(f"Exported: {file_path}")
-        print(f"  Main: {len(main_messages)} messages, {main_contexts_k}K contexts")
-        print(f"  Full: {len(full_messages)} messages, {full_contexts_k}K contexts")
+    incremental = IncrementalExport(output_folder, conversation_file_name, ("id", "conversation_id"), "update_time") if args.incremental else None
+    index = SearchIndex(args.index) if args.index else None
+    records = RecordWriter(output_folder / f"messages.{args.format}") if args.format != "txt" else None
+
+    try:
+        with open_conversations(input_path) as f:
+            conversations = iter_conversations(f) if args.stream else json.load(f)
+            export_conversations(conversations, output_folder, args.jobs or os.cpu_count(), incremental, index, args.estimator, args.dedup, records)
+    finally:
+        if incremental is not None:
+            incremental.save()
+        if index is not None:
+            index.close()
+        if records is not None:
+            records.close()
+            print(f"Wrote {records.count} messages to {output_folder / f'messages.{args.format}'}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+import sys
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from conversation_index import SearchIndex, quote_query
+
+def main():
+    parser = argparse.ArgumentParser(description="Search messages indexed by the V2 extractors with --index")
+    parser.add_argument("index", help="Index file created with --index")
+    parser.add_argument("query", help="Words to search for")
+    parser.add_argument("-n", "--limit", type=int, default=20, help="Maximum number of results (default: 20)")
+    parser.add_argument("--raw", action="store_true", help="Use the query as SQLite FTS5 syntax (OR, NOT, \"phrases\", prefix*)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.index):
+        print(f"Index not found: {args.index}")
+        return
+
+    index = SearchIndex(args.index)
+    query = args.query if args.raw else quote_query(args.query)
+
+    try:
+        results = index.search(query, args.limit)
+    except sqlite3.OperationalError as e:
+        print(f"Invalid query: {e}")
+        return
+    finally:
+        index.close()
+
+    for file_name, title, position, label, snippet in results:
+        print(f"{file_name} (message {position}, {label}) - {title}")
+        print(f"  {' '.join(snippet.split())}")
+
+    print(f"{len(results)} matching messages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""On-disk full-text index of exported messages, stored in SQLite FTS5"""
+import sqlite3
+
+class SearchIndex:
+    """Inverted index from terms to (conversation file, message position) built while exporting
+
+    Every conversation owns a contiguous range of message rowids, so re-exporting a conversation
+    replaces its messages with one range delete instead of a scan.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                file TEXT UNIQUE,
+                title TEXT,
+                first_row INTEGER,
+                last_row INTEGER
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+                text,
+                conversation UNINDEXED,
+                position UNINDEXED,
+                label UNINDEXED
+            );
+        """)
+        row = self.connection.execute("SELECT rowid FROM messages ORDER BY rowid DESC LIMIT 1").fetchone()
+        self.next_row = row[0] + 1 if row else 1
+
+    def add(self, file_name, title, messages):
+        """Index (label, text) messages of one exported file, replacing what was indexed for it before"""
+        existing = self.connection.execute("SELECT id, first_row, last_row FROM files WHERE file = ?", (file_name,)).fetchone()
+        if existing:
+            conversation, first_row, last_row = existing
+            self.connection.execute("DELETE FROM messages WHERE rowid BETWEEN ? AND ?", (first_row, last_row))
+        else:
+            conversation = self.connection.execute("INSERT INTO files (file) VALUES (?)", (file_name,)).lastrowid
+
+        first_row = self.next_row
+        self.connection.executemany(
+            "INSERT INTO messages (rowid, text, conversation, position, label) VALUES (?, ?, ?, ?, ?)",
+            ((first_row + i, text, conversation, i + 1, label) for i, (label, text) in enumerate(messages)),
+        )
+        self.next_row += len(messages)
+        self.connection.execute(
+            "UPDATE files SET title = ?, first_row = ?, last_row = ? WHERE id = ?",
+            (title, first_row, self.next_row - 1, conversation),
+        )
+
+    def search(self, query, limit=20):
+        """Return (file, title, position, label, snippet) for the best matching messages"""
+        return self.connection.execute("""
+            SELECT files.file, files.title, hits.position, hits.label, hits.snippet
+            FROM (
+                SELECT conversation, position, label, snippet(messages, 0, '[', ']', '...', 16) AS snippet, rank
+                FROM messages WHERE messages MATCH ? ORDER BY rank LIMIT ?
+            ) AS hits
+            JOIN files ON files.id = hits.conversation
+            ORDER BY hits.rank
+        """, (query, limit)).fetchall()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+def quote_query(text):
+    """Turn plain words into an FTS5 query that matches messages containing all of them"""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
@@ -0,0 +1,73 @@
+"""Manifest of exported conversations, used by the V2 extractors for --incremental runs"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "manifest.json"
+
+def conversation_version(conv, version_key):
+    """The conversation's update time, or a hash of the whole conversation when the export has none"""
+    version = conv.get(version_key)
+    if version is None:
+        version = hashlib.sha1(json.dumps(conv, sort_keys=True).encode("utf-8")).hexdigest()
+    return version
+
+def load_manifest(output):
+    manifest_path = os.path.join(output, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(output, manifest):
+    temp_path = os.path.join(output, MANIFEST_NAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, os.path.join(output, MANIFEST_NAME))
+
+class IncrementalExport:
+    """Decides which conversations of an export are new or modified and records them in the output folder's manifest
+
+    id_keys are tried in order for the conversation id and version_key names its update time. New conversations
+    are named by file_name(conv, conv_index), with _2, _3, ... added when the name is already taken.
+    """
+
+    def __init__(self, output, file_name, id_keys=("id",), version_key="updated_at"):
+        self.output = output
+        self.file_name = file_name
+        self.id_keys = id_keys
+        self.version_key = version_key
+        self.manifest = load_manifest(output)
+        self.claimed_names = {entry["path"] for entry in self.manifest.values()}
+        self.unchanged_count = 0
+
+    def plan(self, conv, conv_index):
+        """Return (conv_id, version, file name), with no file name when the conversation is unchanged since the last run"""
+        conv_id = next((conv.get(key) for key in self.id_keys if conv.get(key)), None)
+        version = conversation_version(conv, self.version_key)
+        entry = self.manifest.get(conv_id) if conv_id else None
+
+        if entry:
+            if entry["version"] == version and (not entry["exported"] or os.path.exists(os.path.join(self.output, entry["path"]))):
+                self.unchanged_count += 1
+                return conv_id, version, None
+            # Modified conversations keep the file name they got when first exported
+            return conv_id, version, entry["path"]
+
+        file_name = self.file_name(conv, conv_index)
+        stem = file_name[:-len(".txt")]
+        suffix = 2
+        while file_name in self.claimed_names:
+            file_name = f"{stem}_{suffix}.txt"
+            suffix += 1
+        self.claimed_names.add(file_name)
+        return conv_id, version, file_name
+
+    def record(self, manifest_key, exported):
+        conv_id, version, file_name = manifest_key
+        if conv_id:
+            self.manifest[conv_id] = {"version": version, "path": file_name, "exported": exported}
+
+    def save(self):
+        save_manifest(self.output, self.manifest)
@@ -0,0 +1,98 @@
+"""Structured output with one record per message, as JSON Lines or Parquet"""
+import json
+
+from conversation_tree import open_output
+
+FORMATS = ("txt", "jsonl", "parquet")
+RECORD_FIELDS = ("conversation_id", "title", "position", "node_id", "parent_id", "role", "timestamp", "main", "text")
+PARQUET_BATCH_SIZE = 10000
+
+def message_records(tree, root, history, conversation_id, title):
+    """Yield a record for every message in history, in the order of the full history
+
+    parent_id is the node of the previous message on the same branch, so nodes without
+    messages (hidden system messages, the empty root) are skipped over.
+    """
+    message_parents = [-1] * len(tree)
+    for node, _ in tree.preorder(root):
+        parent = tree.parents[node]
+        if parent >= 0:
+            message_parents[node] = parent if tree.messages[parent] else message_parents[parent]
+
+    main_nodes = set(tree.latest_path(root))
+    position = 0
+
+    for node, _ in history:
+        parent = message_parents[node]
+        for role, text in tree.messages[node]:
+            position += 1
+            yield {
+                "conversation_id": conversation_id,
+                "title": title,
+                "position": position,
+                "node_id": tree.node_ids[node],
+                "parent_id": tree.node_ids[parent] if parent >= 0 else None,
+                "role": role,
+                "timestamp": tree.timestamps[node],
+                "main": node in main_nodes,
+                "text": text,
+            }
+
+class RecordWriter:
+    """Streams message records to a .jsonl file (compressed like open_output) or a .parquet file
+
+    Parquet needs pyarrow and is written in row groups of PARQUET_BATCH_SIZE records. timestamp_type
+    is "float" for ChatGPT's epoch seconds or "string" for DeepSeek's ISO dates.
+    """
+
+    def __init__(self, path, timestamp_type="float"):
+        self.count = 0
+        self.out = None
+        self.parquet = None
+
+        if str(path).endswith(".parquet"):
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ValueError("Writing Parquet files needs pyarrow (pip install pyarrow), use --format jsonl instead") from None
+            self.pyarrow = pyarrow
+            self.schema = pyarrow.schema([
+                ("conversation_id", pyarrow.string()),
+                ("title", pyarrow.string()),
+                ("position", pyarrow.int64()),
+                ("node_id", pyarrow.string()),
+                ("parent_id", pyarrow.string()),
+                ("role", pyarrow.string()),
+                ("timestamp", pyarrow.float64() if timestamp_type == "float" else pyarrow.string()),
+                ("main", pyarrow.bool_()),
+                ("text", pyarrow.string()),
+            ])
+            self.parquet = pyarrow.parquet.ParquetWriter(str(path), self.schema)
+            self.batch = []
+        else:
+            self.out = open_output(path)
+            self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def write(self, records):
+        for record in records:
+            self.count += 1
+            if self.out is not None:
+                self.out.write(self.encoder.encode(record))
+                self.out.write("\n")
+            else:
+                self.batch.append(record)
+                if len(self.batch) >= PARQUET_BATCH_SIZE:
+                    self._write_batch()
+
+    def _write_batch(self):
+        if self.batch:
+            self.parquet.write_table(self.pyarrow.Table.from_pylist(self.batch, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        if self.parquet is not None:
+            self._write_batch()
+            self.parquet.close()
+        else:
+            self.out.close()
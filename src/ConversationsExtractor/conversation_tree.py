@@ -0,0 +1,357 @@
+"""Shared conversation loading and tree code for the V1 and V2 extractors"""
+import bz2
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import lzma
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Short runs of letters in any script, groups of up to 3 digits and every other visible character, roughly how BPE tokenizers
+# split text. Chinese and Japanese characters and Hangul syllables are written without spaces and count one token each
+TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|[^\W\d_]{1,8}|\d{1,3}|\S")
+ESTIMATORS = ("chars", "tokens")
+
+@contextmanager
+def open_conversations(path):
+    """Open conversations.json directly or from inside an export ZIP"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            member = next((name for name in archive.namelist() if name.rsplit("/", 1)[-1] == "conversations.json"), None)
+            if member is None:
+                raise FileNotFoundError(f"No conversations.json found in {path}")
+            with archive.open(member) as raw:
+                yield io.TextIOWrapper(raw, encoding="utf-8")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield f
+
+def open_output(path):
+    """Open a text file for writing with a large buffer, compressed when the name ends in .gz, .bz2, .xz or .zst"""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension == ".gz":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if extension == ".bz2":
+        return bz2.open(path, "wt", encoding="utf-8")
+    if extension == ".xz":
+        return lzma.open(path, "wt", encoding="utf-8")
+    if extension == ".zst":
+        try:
+            from compression import zstd
+        except ImportError:
+            raise ValueError("Writing .zst files needs Python 3.14 or newer, use .gz, .bz2 or .xz instead") from None
+        return zstd.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE)
+
+def iter_conversations(f, chunk_size=1024 * 1024):
+    """Yield the items of a top-level JSON array one at a time instead of loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    expecting = "["
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos == len(buffer):
+            buffer = f.read(chunk_size)
+            pos = 0
+            if not buffer:
+                raise ValueError("Unexpected end of JSON input")
+            continue
+
+        char = buffer[pos]
+        if expecting == "[":
+            if char != "[":
+                raise ValueError("Input JSON must be an array of conversations")
+            pos += 1
+            expecting = "item"
+            continue
+
+        if char == "]" and expecting in ("item", "separator"):
+            return
+
+        if expecting == "separator":
+            if char != ",":
+                raise ValueError(f"Expected ',' between conversations, got {char!r}")
+            pos += 1
+            expecting = "value"
+            continue
+
+        read_size = chunk_size
+        while True:
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                more = f.read(read_size)
+                if not more:
+                    raise
+                buffer = buffer[pos:] + more
+                pos = 0
+                read_size *= 2
+
+        yield item
+        expecting = "separator"
+
+        if pos >= chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+class ConversationTree:
+    """Conversation tree with integer node ids and list-backed parent/children links
+
+    Node i has the export id node_ids[i], its parent index in parents[i] (-1 for none),
+    its child indexes in children[i], a timestamp and a list of (role, text) messages
+    that already passed the format's filtering.
+    """
+
+    def __init__(self):
+        self.node_ids = []
+        self.parents = []
+        self.children = []
+        self.timestamps = []
+        self.messages = []
+        self.roots = []
+        self._descendant_counts = None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def add_node(self, node_id, messages, timestamp):
+        self.node_ids.append(node_id)
+        self.parents.append(-1)
+        self.children.append([])
+        self.timestamps.append(timestamp)
+        self.messages.append(messages)
+        return len(self.node_ids) - 1
+
+    def set_parent(self, node, parent):
+        self.parents[node] = parent
+        self.children[parent].append(node)
+
+    def preorder(self, root):
+        """Yield (node, depth) for root and all of its descendants, parents before children"""
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            children = self.children[node]
+            if children:
+                stack.extend((child, depth + 1) for child in reversed(children))
+
+    def descendant_counts(self):
+        """Number of descendants of every node, computed once in a single post-order pass"""
+        if self._descendant_counts is None:
+            counts = [0] * len(self.node_ids)
+            order = [node for root in self.roots for node, _ in self.preorder(root)]
+            for node in reversed(order):
+                parent = self.parents[node]
+                if parent >= 0:
+                    counts[parent] += counts[node] + 1
+            self._descendant_counts = counts
+        return self._descendant_counts
+
+    def history(self, root, key):
+        """Yield (node, depth) for the nodes with messages below root ordered by key(node, depth), ties kept in preorder
+
+        Preorder is cut into runs whose keys never decrease (in practice one run per branch, since
+        messages along a branch are created in order) and the runs are merged lazily. This gives the
+        same order as a stable sort without building and sorting a list of every message.
+        """
+        keys = [None] * len(self.node_ids)
+        depths = [0] * len(self.node_ids)
+        runs = []
+        last_key = None
+        for node, depth in self.preorder(root):
+            if not self.messages[node]:
+                continue
+            node_key = key(node, depth)
+            keys[node] = node_key
+            depths[node] = depth
+            if runs and node_key >= last_key:
+                runs[-1].append(node)
+            else:
+                runs.append([node])
+            last_key = node_key
+        return ((node, depths[node]) for node in heapq.merge(*runs, key=keys.__getitem__))
+
+    def latest_path(self, root):
+        """Follow the child with the most descendants at every fork, keeping the first one on ties"""
+        counts = self.descendant_counts()
+        path = [root]
+        node = root
+        while self.children[node]:
+            node = max(self.children[node], key=counts.__getitem__)
+            path.append(node)
+        return path
+
+def estimate_tokens(text):
+    """Approximate token count of text without a real tokenizer"""
+    return len(TOKEN_PATTERN.findall(text))
+
+class ContextCounter:
+    """Running message, character and token totals, fed one "LABEL: text" message at a time so nothing is joined
+
+    The character total matches the length of the messages joined with newlines. Tokens are only
+    estimated with the "tokens" estimator, per role as well as in total.
+    """
+
+    def __init__(self, estimator="chars"):
+        self.estimator = estimator
+        self.messages = 0
+        self.chars = 0
+        self.tokens = 0
+        self.role_tokens = {"USER": 0, "ASSISTANT": 0}
+
+    def add(self, label, text):
+        if self.messages:
+            self.chars += 1
+        self.messages += 1
+        self.chars += len(label) + 2 + len(text)
+
+        if self.estimator == "tokens":
+            tokens = estimate_tokens(label) + 1 + estimate_tokens(text)
+            self.tokens += tokens
+            # Labels look like "USER" or "USER 2", the role is the first word
+            role = label.split(" ", 1)[0]
+            self.role_tokens[role] = self.role_tokens.get(role, 0) + tokens
+
+    def header(self, name):
+        """Header line for an export file, e.g. "Main Contexts: 12K" """
+        if self.estimator == "tokens":
+            roles = ", ".join(f"{role} {tokens}" for role, tokens in self.role_tokens.items())
+            return f"{name} Tokens: {self.tokens} ({roles})"
+        return f"{name} Contexts: {self.chars // 1000}K"
+
+    def summary(self):
+        """Short form for progress output, e.g. "12K contexts" """
+        if self.estimator == "tokens":
+            return f"{self.tokens} tokens"
+        return f"{self.chars // 1000}K contexts"
+
+class MessageInterner:
+    """Numbers distinct message texts by a blake2b digest so repeats can be written as references"""
+
+    def __init__(self):
+        self.numbers = {}
+
+    def intern(self, text):
+        """Return (number, first_time) for text"""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        number = self.numbers.get(key)
+        if number is not None:
+            return number, False
+        number = self.numbers[key] = len(self.numbers) + 1
+        return number, True
+
+def write_messages(out, messages, interner=None):
+    """Write (label, text) messages separated by blank lines
+
+    With an interner, the first copy of every text is written as "#n LABEL: text" and
+    later copies as "LABEL: (same as #n)".
+    """
+    separator = ""
+    for label, text in messages:
+        if interner is None:
+            out.write(f"{separator}{label}: {text}")
+        else:
+            number, first_time = interner.intern(text)
+            if first_time:
+                out.write(f"{separator}#{number} {label}: {text}")
+            else:
+                out.write(f"{separator}{label}: (same as #{number})")
+        separator = "\n\n"
+
+def role_label(role):
+    return "USER" if role == "user" else "ASSISTANT"
+
+def chatgpt_messages(message, include_system=False, text_only=True, skip_empty=True):
+    """Parts of a ChatGPT message as (role, text) pairs, by default only the meaningful parts of text messages"""
+    if not message:
+        return []
+
+    role = message.get("author", {}).get("role", "")
+    if role == "system" and not include_system:
+        return []
+
+    content = message.get("content")
+    if not content:
+        return []
+
+    if isinstance(content, str):
+        return [(role, content)] if content.strip() else []
+
+    if text_only and content.get("content_type") != "text":
+        return []
+
+    parts = content.get("parts", [])
+    if not skip_empty:
+        return [(role, str(part)) for part in parts]
+    return [(role, str(part)) for part in parts if part and str(part).strip()]
+
+def deepseek_messages(message):
+    """Non-empty fragments of a DeepSeek message as (role, text) pairs"""
+    if not message or "fragments" not in message:
+        return []
+
+    messages = []
+    for fragment in message["fragments"]:
+        content = fragment.get("content", "")
+        if content.strip():
+            role = "user" if fragment.get("type", "") == "REQUEST" else "assistant"
+            messages.append((role, content))
+    return messages
+
+def _add_nodes(tree, mapping, get_messages, timestamp_key):
+    index = {}
+    for node_id, node in mapping.items():
+        message = node.get("message")
+        timestamp = message.get(timestamp_key) if message else None
+        index[node_id] = tree.add_node(node_id, get_messages(message), timestamp)
+        if node.get("parent") is None:
+            tree.roots.append(index[node_id])
+    return index
+
+def _link_by_children(tree, mapping, index):
+    # Old exports may only store "parent" on the root, so a node without one is a root only if no node lists it as a child
+    listed = {index[child_id] for node in mapping.values() for child_id in node.get("children", []) if child_id in index}
+    tree.roots = [root for root in tree.roots if root not in listed] or tree.roots[:1]
+    roots = set(tree.roots)
+    for node_id, node in mapping.items():
+        parent = index[node_id]
+        for child_id in node.get("children", []):
+            child = index.get(child_id)
+            # The first parent listing a node wins, which also keeps cycles out of the tree
+            if child is not None and child not in roots and tree.parents[child] == -1 and child != parent:
+                tree.set_parent(child, parent)
+
+def chatgpt_tree(mapping, include_system=False, text_only=True, skip_empty=True):
+    """Build a tree from a ChatGPT mapping whose nodes point to their "parent" """
+    tree = ConversationTree()
+    index = _add_nodes(tree, mapping, lambda message: chatgpt_messages(message, include_system, text_only, skip_empty), "create_time")
+    for node_id, node in mapping.items():
+        parent = index.get(node.get("parent"))
+        if parent is not None and parent != index[node_id]:
+            tree.set_parent(index[node_id], parent)
+    return tree
+
+def chatgpt_children_tree(mapping, include_system=False, text_only=True, skip_empty=True):
+    """Build a tree from an old-format ChatGPT mapping whose nodes list their "children" """
+    tree = ConversationTree()
+    index = _add_nodes(tree, mapping, lambda message: chatgpt_messages(message, include_system, text_only, skip_empty), "create_time")
+    _link_by_children(tree, mapping, index)
+    return tree
+
+def deepseek_tree(mapping):
+    """Build a tree from a DeepSeek mapping with "fragments" messages"""
+    tree = ConversationTree()
+    index = _add_nodes(tree, mapping, deepseek_messages, "inserted_at")
+    _link_by_children(tree, mapping, index)
+    return tree